@@ -2,18 +2,43 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import os
 import sys
+import time
+import json
+import base64
+import hashlib
+import csv
+import threading
+import functools
+import mimetypes
+from datetime import datetime, timedelta
+from itertools import groupby
+import click
 import dateutil.parser
-import babel.dates 
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import babel
+import babel.dates
+from flask import Flask, Blueprint, render_template, request, Response, flash, redirect, url_for, abort, jsonify, stream_with_context, send_from_directory
+from markupsafe import Markup
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import exc
+from sqlalchemy.dialects import postgresql
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
 from flask_migrate import Migrate
 import config
+from cache import create_cache
+from instrumentation import SQLInstrumentation
+from database import init_statement_timeouts, pool_stats, constraint_name
+from routing import RoutingSQLAlchemy
+from refresher import DebouncedRefresher
+from autocomplete import PrefixIndex
+from projections import Projection, LazyLoadGuard
+from conditional import conditional, template_digest
+from assets import AssetManifest, build_assets
+from importer import read_rows, batches, local_time, clean_venue, clean_artist, clean_show
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -27,14 +52,25 @@ app.config.from_object('config')
 app.config['SQLALCHEMY_DATABASE_URI'] = config.SQLALCHEMY_DATABASE_URI
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-db = SQLAlchemy(app)
+db = RoutingSQLAlchemy(app)
 migrate = Migrate(app,db)
+init_statement_timeouts(app)
+page_cache = create_cache(app.config)
+sql_instrumentation = SQLInstrumentation(app) if app.config.get('SQL_INSTRUMENTATION') else None
+lazy_load_guard = LazyLoadGuard(app)
+asset_manifest = AssetManifest(app.config['ASSET_BUILD_FOLDER'])
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+      db.Index('ix_Venue_city_state_name', 'city', 'state', 'name', 'id'),
+      db.Index('ix_Venue_search_text_trgm', 'search_text', postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}),
+      db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+      db.Index('ix_Venue_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String , nullable=False)
@@ -50,6 +86,14 @@ class Venue(db.Model):
     genres = db.Column("genres" , db.ARRAY(db.String()) , nullable=False)
     seeking_talent = db.Column(db.Boolean , default=False)
     seeking_description = db.Column(db.String(200))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # kept up to date by postgres, trigram indexed for search
+    search_text = db.Column(db.Text, db.Computed("name || ' ' || city || ' ' || state"))
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.text('clock_timestamp()'))
+    # set by every ORM update and, for the show counters, by a trigger
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.text('clock_timestamp()'),
+                           onupdate=db.func.clock_timestamp())
     shows = db.relationship('Show', backref='venue' )
 
     def __ref__(self):
@@ -57,6 +101,13 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+      db.Index('ix_Artist_name', 'name', 'id'),
+      db.Index('ix_Artist_city_state_name', 'city', 'state', 'name', 'id'),
+      db.Index('ix_Artist_search_text_trgm', 'search_text', postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}),
+      db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+      db.Index('ix_Artist_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String , nullable=False)
@@ -69,6 +120,14 @@ class Artist(db.Model):
     website_link = db.Column(db.String(120))
     seeking_description = db.Column(db.String(200))
     looking_for_venues = db.Column(db.Boolean , default=False)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # kept up to date by postgres, trigram indexed for search
+    search_text = db.Column(db.Text, db.Computed("name || ' ' || city || ' ' || state"))
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.text('clock_timestamp()'))
+    # set by every ORM update and, for the show counters, by a trigger
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.text('clock_timestamp()'),
+                           onupdate=db.func.clock_timestamp())
     shows = db.relationship('Show', backref='artist' )
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
   
@@ -79,32 +138,632 @@ class Artist(db.Model):
 
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 
+show_period = db.func.tsrange(db.literal_column('start_time'), db.literal_column('end_time'))
+
+def show_duration(minutes=None):
+  return timedelta(minutes=minutes or app.config.get('SHOW_DEFAULT_DURATION', 120))
+
+def default_end_time(context):
+  # rows inserted without an end time run for SHOW_DEFAULT_DURATION minutes
+  start_time = context.get_current_parameters()['start_time']
+  if isinstance(start_time, str):
+    start_time = dateutil.parser.parse(start_time)
+  return start_time + show_duration()
+
 class Show(db.Model):
 
   __tablename__ = 'Show'
+  __table_args__ = (
+    db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_Show_start_time_desc', db.text('start_time DESC'), db.text('id DESC')),
+    # no venue or artist is booked twice at once, enforced by GiST indexes on
+    # [start_time, end_time) (see the show end time migration)
+    db.CheckConstraint('end_time > start_time', name='Show_end_after_start'),
+    postgresql.ExcludeConstraint(('venue_id', '='), (show_period, '&&'), name='Show_venue_no_overlap', using='gist'),
+    postgresql.ExcludeConstraint(('artist_id', '='), (show_period, '&&'), name='Show_artist_no_overlap', using='gist'),
+  )
 
   id = db.Column(db.Integer, primary_key=True)
   artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id') , nullable=False)
   venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False )
   start_time = db.Column(db.DateTime , nullable=False)
+  end_time = db.Column(db.DateTime, nullable=False, default=default_end_time)
+  created_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.text('clock_timestamp()'))
+  updated_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.text('clock_timestamp()'),
+                         onupdate=db.func.clock_timestamp())
 
   def __ref__(self):
       return f"Show {self.id} Artist: {self.artist_id} Venue:  {self.venue_id}"
 
+# materialized, denormalized rows behind /shows, refreshed CONCURRENTLY a
+# moment after show, artist and venue writes (see refresh_show_listing).
+# Kept out of db.metadata so create_all / autogenerate leave it alone.
+show_listing_view = db.Table('show_listing', db.MetaData(),
+  db.Column('id', db.Integer, primary_key=True),
+  db.Column('start_time', db.DateTime),
+  db.Column('venue_id', db.Integer),
+  db.Column('venue_name', db.String),
+  db.Column('artist_id', db.Integer),
+  db.Column('artist_name', db.String),
+  db.Column('artist_image_link', db.String),
+  # latest of the show's, venue's and artist's updated_at
+  db.Column('updated_at', db.DateTime(timezone=True)),
+)
+
+class ShowRollover(db.Model):
+  # single row holding the time up to which the upcoming / past counters on
+  # Venue and Artist are split. Insert, update and delete triggers on Show
+  # keep the counters in step (see the show counters migration).
+
+  __tablename__ = 'ShowRollover'
+
+  id = db.Column(db.Integer, primary_key=True)
+  rolled_over_at = db.Column(db.DateTime, nullable=False)
+
+MINUTES_PER_WEEK = 7 * 24 * 60
+
+class Availability(db.Model):
+  # a window in which an artist or a venue can be booked. One-off windows
+  # are a period; weekly ones repeat at week_minutes (minutes since Monday
+  # 00:00) on every week within their period, which is open ended unless an
+  # end date was given. Both are ranges behind GiST indexes, so "who is free
+  # then" is an index scan (see available()).
+
+  __tablename__ = 'Availability'
+  __table_args__ = (
+    db.CheckConstraint('num_nonnulls(artist_id, venue_id) = 1', name='Availability_one_owner'),
+    db.CheckConstraint('week_minutes <@ int4range(0, %d)' % MINUTES_PER_WEEK, name='Availability_week_minutes'),
+    db.Index('ix_Availability_artist_id_period', 'artist_id', 'period', postgresql_using='gist',
+             postgresql_where=db.text('artist_id IS NOT NULL')),
+    db.Index('ix_Availability_venue_id_period', 'venue_id', 'period', postgresql_using='gist',
+             postgresql_where=db.text('venue_id IS NOT NULL')),
+    db.Index('ix_Availability_period', 'period', postgresql_using='gist'),
+  )
+
+  id = db.Column(db.Integer, primary_key=True)
+  artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'))
+  venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'))
+  period = db.Column(postgresql.TSRANGE, nullable=False)
+  week_minutes = db.Column(postgresql.INT4RANGE)
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+def encode_cursor(*values):
+  # opaque, url safe cursor for "show more" / "next page" links
+  raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+  return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, *types):
+  # turns a cursor back into typed values, a malformed cursor is a bad request
+  if not cursor:
+    return None
+  try:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    if len(values) != len(types):
+      raise ValueError(cursor)
+    return tuple(convert(value) for convert, value in zip(types, values))
+  except (ValueError, TypeError):
+    abort(400)
+
+def seek(query, columns, cursor, descending=False):
+  # keyset pagination: order by columns and continue strictly after the cursor,
+  # so every page costs the same however deep the user has scrolled
+  if descending:
+    query = query.order_by(*[column.desc() for column in columns])
+  else:
+    query = query.order_by(*columns)
+  if cursor is not None:
+    position = db.tuple_(*columns)
+    if descending:
+      query = query.filter(position < db.tuple_(*cursor))
+    else:
+      query = query.filter(position > db.tuple_(*cursor))
+  return query
+
+def page(query, limit, key, shape=None, stream=False):
+  # fetches one row past the limit to know whether there is a next page.
+  # shape turns the rows into what the template iterates; with stream the
+  # rows are read lazily (see StreamedPage) and next_cursor comes later.
+  shape = shape or (lambda rows: rows)
+  if stream:
+    return StreamedPage(query, limit, key, shape), None
+  if not limit:
+    return list(shape(query.all())), None
+  rows = query.limit(limit + 1).all()
+  if len(rows) <= limit:
+    return list(shape(rows)), None
+  rows = rows[:limit]
+  return list(shape(rows)), encode_cursor(*key(rows[-1]))
+
+class StreamedPage(object):
+  # a listing page read from a server-side cursor STREAM_BATCH_SIZE rows at a
+  # time while its template is streamed. next_cursor is set once the rows
+  # have been iterated, which the template does before the "next page" link.
+
+  def __init__(self, query, limit, key, shape):
+    self.query = query
+    self.limit = limit
+    self.key = key
+    self.shape = shape
+    self.next_cursor = None
+
+  def __iter__(self):
+    return iter(self.shape(self.rows()))
+
+  def rows(self):
+    query = self.query.limit(self.limit + 1) if self.limit else self.query
+    last = None
+    for count, row in enumerate(query.yield_per(app.config.get('STREAM_BATCH_SIZE', 500))):
+      if self.limit and count == self.limit:
+        self.next_cursor = encode_cursor(*self.key(last))
+        return
+      last = row
+      yield row
+
+def page_size(stream=False):
+  # ?limit=, capped at MAX_PAGE_SIZE. A missing, malformed, zero or negative
+  # one gets the default, page() would read the whole listing for it.
+  default = app.config.get('STREAM_PAGE_SIZE' if stream else 'PAGE_SIZE')
+  limit = request.args.get('limit', type=int)
+  if limit is None or limit <= 0:
+    return default
+  return min(limit, app.config.get('MAX_PAGE_SIZE', 500))
+
+# named column sets per view. Rows come back as small read-only records
+# instead of entities or dicts, see projections.py.
+venue_listing_projection = Projection('VenueListing',
+  id=Venue.id,
+  name=Venue.name,
+  city=Venue.city,
+  state=Venue.state,
+  # the stored counter, see rollover_shows()
+  num_upcoming_shows=Venue.upcoming_shows_count,
+)
+artist_listing_projection = Projection('ArtistListing', id=Artist.id, name=Artist.name)
+show_listing_projection = Projection('ShowListing',
+  id=show_listing_view.c.id,
+  venue_id=show_listing_view.c.venue_id,
+  venue_name=show_listing_view.c.venue_name,
+  artist_id=show_listing_view.c.artist_id,
+  artist_name=show_listing_view.c.artist_name,
+  artist_image_link=show_listing_view.c.artist_image_link,
+  start_time=show_listing_view.c.start_time,
+)
+venue_show_projection = Projection('VenueShow',
+  show_id=Show.id,
+  artist_id=Show.artist_id,
+  artist_name=Artist.name,
+  artist_image_link=Artist.image_link,
+  start_time=Show.start_time,
+)
+artist_show_projection = Projection('ArtistShow',
+  show_id=Show.id,
+  venue_id=Show.venue_id,
+  venue_name=Venue.name,
+  venue_image_link=Venue.image_link,
+  start_time=Show.start_time,
+)
+search_projections = {
+  Venue: Projection('VenueSearchResult', id=Venue.id, name=Venue.name),
+  Artist: Projection('ArtistSearchResult', id=Artist.id, name=Artist.name),
+}
+
+def venue_listing_query(after=None):
+  query = venue_listing_projection.query(db.session)
+  cursor = decode_cursor(after, str, str, str, int)
+  return seek(query, (Venue.city, Venue.state, Venue.name, Venue.id), cursor)
+
+def venue_listing_key(row):
+  return (row.city, row.state, row.name, row.id)
+
+def venue_listing(limit=None, after=None):
+  return page(venue_listing_query(after), limit, venue_listing_key, venue_listing_projection.records)
+
+def group_areas(venues):
+  # the listing is ordered by area first so a group is never split within a page
+  for (city, state), area_venues in groupby(venues, key=lambda venue: (venue.city, venue.state)):
+    yield {
+      "city": city,
+      "state": state,
+      "venues": list(area_venues),
+    }
+
+def venue_areas(limit=None, after=None, stream=False):
+  # one page of venues grouped by (city, state)
+  return page(venue_listing_query(after), limit, venue_listing_key,
+              lambda rows: group_areas(venue_listing_projection.records(rows)), stream)
+
+def artist_listing(limit=None, after=None, stream=False):
+  query = artist_listing_projection.query(db.session)
+  cursor = decode_cursor(after, str, int)
+  query = seek(query, (Artist.name, Artist.id), cursor)
+  return page(query, limit, lambda row: (row.name, row.id), artist_listing_projection.records, stream)
+
+def show_listing(limit=None, after=None, stream=False):
+  listing = show_listing_view.c
+  query = show_listing_projection.query(db.session)
+  cursor = decode_cursor(after, datetime.fromisoformat, int)
+  query = seek(query, (listing.start_time, listing.id), cursor, descending=True)
+  return page(query, limit, lambda row: (row.start_time, row.id), show_listing_projection.records, stream)
+
+def show_history(query, projection, upcoming, now, limit=None, after=None):
+  # splits shows into upcoming / past in SQL and seeks past the (start_time, id)
+  # cursor so a long history is never loaded in one go
+  if upcoming:
+    query = query.filter(Show.start_time > now)
+  else:
+    query = query.filter(Show.start_time <= now)
+  cursor = decode_cursor(after, datetime.fromisoformat, int)
+  query = seek(query, (Show.start_time, Show.id), cursor, descending=not upcoming)
+  return page(query, limit, lambda row: (row.start_time, row.show_id), projection.records)
+
+def venue_shows_query(venue_id):
+  return venue_show_projection.query(db.session) \
+    .join(Artist, Show.artist_id == Artist.id) \
+    .filter(Show.venue_id == venue_id)
+
+def artist_shows_query(artist_id):
+  return artist_show_projection.query(db.session) \
+    .join(Venue, Show.venue_id == Venue.id) \
+    .filter(Show.artist_id == artist_id)
+
+def requested_genres():
+  # ?genre=Jazz&genre=Blues, restricted to the vocabulary in forms.py
+  known = {genre for genre, label in genre_choices}
+  return sorted({genre for genre in request.values.getlist('genre') if genre in known})
+
+def requested_match():
+  return 'all' if request.values.get('match') == 'all' else 'any'
+
+def genre_filter(model, genres, match='any'):
+  # @> (has all of) / && (has any of), both served by the GIN index on genres
+  operator = '@>' if match == 'all' else '&&'
+  return model.genres.op(operator)(db.cast(list(genres), postgresql.ARRAY(db.String)))
+
+def search_filters(model, term, genres=(), match='any'):
+  # name, city, state (pg_trgm GIN index on search_text) and genres
+  filters = []
+  if term:
+    pattern = '%' + term.replace('!', '!!').replace('%', '!%').replace('_', '!_') + '%'
+    matches = [
+      model.search_text.ilike(pattern, escape='!'),
+      model.search_text.op('%>')(term),
+    ]
+    term_genres = [genre for genre, label in genre_choices if term.lower() in genre.lower()]
+    if term_genres:
+      matches.append(genre_filter(model, term_genres))
+    filters.append(db.or_(*matches))
+  if genres:
+    filters.append(genre_filter(model, genres, match))
+  return filters
+
+def search(model, term, limit=None, offset=0, genres=(), match='any'):
+  # ranked search, narrowed down to the selected genres, with genre facets
+  term = term.strip()
+  if not limit or limit <= 0:
+    limit = app.config.get('PAGE_SIZE')
+  projection = search_projections[model]
+  query = projection.query(db.session).filter(*search_filters(model, term, genres, match))
+  if term:
+    rank = db.func.word_similarity(term, model.search_text)
+    query = query.order_by(rank.desc(), model.name, model.id)
+  else:
+    query = query.order_by(model.name, model.id)
+
+  count = query.order_by(None).count()
+  rows = query.limit(limit).offset(offset).all()
+  return {
+    "count": count,
+    "data": list(projection.records(rows)),
+    # an empty page has no next one, a link to it would point back here
+    "next_offset": offset + len(rows) if rows and offset + len(rows) < count else None,
+    "facets": genre_facets(model, term, genres, match),
+  }
+
+def facet_generation(kind):
+  # part of every facet cache key, invalidate_facets() starts a new one
+  key = 'facets:%s' % kind
+  generation = page_cache.get(key)
+  if generation is None:
+    generation = '%x' % time.time_ns()
+    page_cache.set(key, generation)
+  return generation
+
+def invalidate_facets(*kinds):
+  # called after every venue / artist write: besides genres, a changed name
+  # or city moves a row in or out of a search's result set
+  page_cache.delete(*['facets:%s' % kind for kind in kinds])
+
+def genre_facets(model, term, genres=(), match='any'):
+  # per-genre counts over the current result set, in vocabulary order
+  kind = model.__tablename__.lower()
+  selection = json.dumps([term.lower(), list(genres), match])
+  key = 'facets:%s:%s:%s' % (kind, facet_generation(kind), hashlib.sha1(selection.encode('utf-8')).hexdigest())
+  facets = page_cache.get(key)
+  if facets is not None:
+    return json.loads(facets)
+
+  matching = db.session.query(db.func.unnest(model.genres).label('genre')) \
+    .filter(*search_filters(model, term, genres, match)).subquery()
+  counts = dict(db.session.query(matching.c.genre, db.func.count()).group_by(matching.c.genre))
+  facets = [{
+    "genre": genre,
+    "count": counts.get(genre, 0),
+    "selected": genre in genres,
+  } for genre, label in genre_choices if counts.get(genre) or genre in genres]
+  page_cache.set(key, json.dumps(facets))
+  return facets
+
+availability_projection = Projection('AvailabilityWindow',
+  id=Availability.id,
+  starts=db.func.lower(Availability.period, type_=db.DateTime),
+  ends=db.func.upper(Availability.period, type_=db.DateTime),
+  # minutes since Monday 00:00, None for one-off windows
+  week_from=db.func.lower(Availability.week_minutes, type_=db.Integer),
+  week_to=db.func.upper(Availability.week_minutes, type_=db.Integer),
+)
+available_projections = {
+  Venue: Projection('AvailableVenue', id=Venue.id, name=Venue.name, city=Venue.city, state=Venue.state, genres=Venue.genres),
+  Artist: Projection('AvailableArtist', id=Artist.id, name=Artist.name, city=Artist.city, state=Artist.state, genres=Artist.genres),
+}
+
+def week_minutes(start, end):
+  # [start, end) as (lower, upper) minutes since Monday 00:00, in two parts
+  # where it wraps past Sunday midnight
+  minutes = int((end - start).total_seconds() // 60)
+  if minutes >= MINUTES_PER_WEEK:
+    return [(0, MINUTES_PER_WEEK)]
+  lower = start.weekday() * 24 * 60 + start.hour * 60 + start.minute
+  upper = lower + minutes
+  if upper <= MINUTES_PER_WEEK:
+    return [(lower, upper)]
+  return [(lower, MINUTES_PER_WEEK), (0, upper - MINUTES_PER_WEEK)]
+
+def owner_column(model):
+  return Availability.venue_id if model is Venue else Availability.artist_id
+
+def availability_windows(model, id):
+  query = availability_projection.query(db.session).filter(owner_column(model) == id)
+  return list(availability_projection.records(query.order_by(Availability.period, Availability.id)))
+
+def available_query(model, start, end, city=None, state=None, genres=(), match='any'):
+  """Venues or artists with a window overlapping [start, end) and no show in it.
+
+  The window is found on the (owner, period) GiST index and a show in the
+  way on the index of the Show exclusion constraint, both probed per row of
+  the city / state / genre filtered venue or artist scan.
+  """
+  period = db.func.tsrange(start, end)
+  weekly = db.or_(*[Availability.week_minutes.overlaps(db.func.int4range(lower, upper))
+                    for lower, upper in week_minutes(start, end)])
+  open_window = db.session.query(Availability.id) \
+    .filter(owner_column(model) == model.id, Availability.period.overlaps(period)) \
+    .filter(db.or_(Availability.week_minutes.is_(None), weekly)).exists()
+  booked = db.session.query(Show.id) \
+    .filter((Show.venue_id if model is Venue else Show.artist_id) == model.id) \
+    .filter(db.func.tsrange(Show.start_time, Show.end_time).op('&&')(period)).exists()
+
+  query = available_projections[model].query(db.session).filter(open_window, ~booked)
+  if city:
+    query = query.filter(model.city == city)
+  if state:
+    query = query.filter(model.state == state)
+  if genres:
+    query = query.filter(genre_filter(model, genres, match))
+  return query
+
+def available(model, start, end, city=None, state=None, genres=(), match='any', limit=None, after=None):
+  # one name ordered page of available_query()
+  query = available_query(model, start, end, city, state, genres, match)
+  query = seek(query, (model.name, model.id), decode_cursor(after, str, int))
+  return page(query, limit, lambda row: (row.name, row.id), available_projections[model].records)
+
+def venue_page_keys(venue_id):
+  # a venue's name and image also appear on the page of every artist it booked
+  artists = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+  return ['venue:%d' % venue_id] + ['artist:%d' % row.artist_id for row in artists]
+
+def artist_page_keys(artist_id):
+  venues = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+  return ['artist:%d' % artist_id] + ['venue:%d' % row.venue_id for row in venues]
+
+def show_history_limit():
+  # ?limit= up to SHOW_HISTORY_LIMIT, a missing, malformed, zero or negative
+  # one gets SHOW_HISTORY_LIMIT (page() would read the whole history for 0)
+  default = app.config.get('SHOW_HISTORY_LIMIT')
+  limit = request.args.get('limit', type=int)
+  if limit is None or limit <= 0:
+    return default
+  return min(limit, default) if default else limit
+
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+datetime_formats = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+@functools.lru_cache(maxsize=None)
+def datetime_pattern(format, locale):
+  # compiling the pattern and loading the locale once per (format, locale)
+  # keeps the filter cheap on pages with thousands of show tiles
+  return babel.dates.parse_pattern(datetime_formats.get(format, format)), babel.Locale.parse(locale)
+
+def format_datetime(value, format='medium', locale='en'):
+  if not isinstance(value, datetime):
+    value = dateutil.parser.parse(value)
+  pattern, locale = datetime_pattern(format, locale)
+  return pattern.apply(value, locale)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Show listing refresh.
+#----------------------------------------------------------------------------#
+
+def refresh_show_listing():
+  with app.app_context():
+    try:
+      db.session.execute(db.text('REFRESH MATERIALIZED VIEW CONCURRENTLY show_listing'))
+      db.session.commit()
+    finally:
+      db.session.remove()
+
+show_listing_refresher = DebouncedRefresher(
+  refresh_show_listing,
+  app.config.get('SHOW_LISTING_REFRESH_DELAY', 2),
+  app.config.get('SHOW_LISTING_REFRESH_MAX_DELAY', 30),
+  app.logger,
+)
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+def rollover_ttl(upcoming_shows):
+  # a cached page goes stale when its next upcoming show becomes a past show
+  if not upcoming_shows:
+    return None
+  seconds = (upcoming_shows[0].start_time - datetime.now()).total_seconds()
+  return max(1, min(seconds, app.config.get('PAGE_CACHE_TTL') or seconds))
+
+def render_detail(kind, entity_id, build):
+  # the body of a venue / artist page is cached per id, write handlers delete
+  # the affected keys. Paged show history (any query string) is never cached.
+  key = '%s:%d' % (kind, entity_id)
+  cacheable = not request.args
+  page = page_cache.get(key) if cacheable else None
+  if page is None:
+    data = build(entity_id)
+    page = json.dumps({
+      "name": data['name'],
+      "content": render_template('pages/show_%s_content.html' % kind, **{kind: data}),
+    })
+    if cacheable:
+      page_cache.set(key, page, rollover_ttl(data['upcoming_shows']))
+  page = json.loads(page)
+  return render_template('pages/show_%s.html' % kind, content=Markup(page['content']), **{kind: page})
+
+#----------------------------------------------------------------------------#
+# Streaming.
+#----------------------------------------------------------------------------#
+
+def stream_template(template_name, **context):
+  # Flask 2.1 has no stream_template: render lazily while the response is
+  # sent, in chunks of STREAM_BUFFER template events
+  app.update_template_context(context)
+  stream = app.jinja_env.get_template(template_name).stream(context)
+  stream.enable_buffering(app.config.get('STREAM_BUFFER', 100))
+  return stream_with_context(stream)
+
+def streaming():
+  return bool(app.config.get('STREAM_LISTINGS'))
+
+def render_listing(template_name, stream, **context):
+  # streamed listings hand the template a StreamedPage, rows are fetched as
+  # it renders them and the next page cursor is read off it at the end
+  if stream:
+    return Response(stream_template(template_name, **context), mimetype='text/html')
+  return render_template(template_name, **context)
+
+#----------------------------------------------------------------------------#
+# Assets.
+#----------------------------------------------------------------------------#
+
+def asset_url(path):
+  # the fingerprinted /assets/ url once `flask build-assets` has run, the
+  # plain /static/ one before (and for files added since the last build)
+  built = asset_manifest.built(path)
+  if built is None:
+    return url_for('static', filename=path)
+  return url_for('asset', filename=built)
+
+app.jinja_env.globals['asset_url'] = asset_url
+
+#----------------------------------------------------------------------------#
+# Autocomplete.
+#----------------------------------------------------------------------------#
+
+autocomplete_index = PrefixIndex()
+
+def build_autocomplete_index():
+  names = [('venue', row.id, row.name) for row in db.session.query(Venue.id, Venue.name)]
+  names += [('artist', row.id, row.name) for row in db.session.query(Artist.id, Artist.name)]
+  autocomplete_index.load(names)
+
+def start_autocomplete_rebuilds(interval):
+  # write handlers keep this worker's index current, the rebuild picks up
+  # writes made through other workers and `flask import`
+  def run():
+    while True:
+      time.sleep(interval)
+      with app.app_context():
+        try:
+          build_autocomplete_index()
+        except exc.SQLAlchemyError:
+          app.logger.exception('autocomplete rebuild failed')
+        finally:
+          db.session.remove()
+
+  thread = threading.Thread(target=run, name='autocomplete-rebuild', daemon=True)
+  thread.start()
+  return thread
+
+@app.before_first_request
+def start_autocomplete():
+  build_autocomplete_index()
+  interval = app.config.get('AUTOCOMPLETE_REBUILD_INTERVAL')
+  if interval:
+    start_autocomplete_rebuilds(interval)
+
+#----------------------------------------------------------------------------#
+# Validators.
+#----------------------------------------------------------------------------#
+
+# ETag / Last-Modified for the HTML pages, see conditional.py. Each validator
+# reads max(updated_at) and a count off indexes, so a revalidation that comes
+# back 304 skips the listing or detail queries and the rendering.
+# the asset manifest is in it too, a rebuild changes the asset urls on every page
+validator_salt = app.config.get('RELEASE', '') + template_digest(os.path.join(app.root_path, app.template_folder)) + \
+  hashlib.sha1(json.dumps(asset_manifest.assets, sort_keys=True).encode('utf-8')).hexdigest()
+
+def validated(validator, modified_since=True):
+  if not app.config.get('HTTP_VALIDATORS'):
+    return lambda view: view
+  return conditional(validator, validator_salt, modified_since)
+
+def table_validator(updated_at):
+  # a row added, changed or removed moves the max or the count. A delete
+  # moves only the count, which is in the ETag but not in Last-Modified, so
+  # these pages are validated with modified_since=False.
+  def validator():
+    last_modified, count = db.session.query(db.func.max(updated_at), db.func.count()) \
+      .select_from(updated_at.table).one()
+    return last_modified, [last_modified, count]
+  return validator
+
+def detail_validator(model, other, owner_column, other_column):
+  # the entity itself (its counters included, see the updated_at migration)
+  # and the names and images of everyone it shares a show with
+  def validator(entity_id):
+    others = db.session.query(db.func.max(other.updated_at)) \
+      .join(Show, other_column == other.id).filter(owner_column == model.id).scalar_subquery()
+    row = db.session.query(model.updated_at, others).filter(model.id == entity_id).first()
+    if row is None:
+      return None
+    last_modified = max(value for value in row if value is not None)
+    return last_modified, list(row)
+  return validator
+
+venue_validator = detail_validator(Venue, Artist, Show.venue_id, Show.artist_id)
+artist_validator = detail_validator(Artist, Venue, Show.artist_id, Show.venue_id)
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -114,89 +773,67 @@ def index():
   return render_template('pages/home.html')
 
 
+@app.route('/assets/<path:filename>')
+def asset(filename):
+  # a fingerprinted file never changes, so it is cached for ASSET_MAX_AGE
+  # without revalidation. The .br / .gz variant built next to it is sent
+  # when the client accepts it, nothing is compressed per request. Files of
+  # earlier builds are served as well, for pages rendered before a rebuild.
+  if not asset_manifest.exists(filename):
+    abort(404)
+  name, encoding = asset_manifest.variant(filename, request.accept_encodings)
+  response = send_from_directory(asset_manifest.folder, name,
+                                 mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+  if encoding:
+    response.content_encoding = encoding
+  response.vary.add('Accept-Encoding')
+  response.cache_control.no_cache = None
+  response.cache_control.public = True
+  response.cache_control.max_age = app.config.get('ASSET_MAX_AGE', 365 * 24 * 3600)
+  response.cache_control.immutable = True
+  return response
+
+@app.route('/autocomplete')
+def autocomplete():
+  # venue / artist names starting with ?q (at any word), from the in-process
+  # index only. ?type=venue or ?type=artist narrows it down.
+  kinds = {request.args['type']} if request.args.get('type') in ('venue', 'artist') else None
+  limit = min(request.args.get('limit', 10, type=int), 50)
+  return jsonify({"data": autocomplete_index.search(request.args.get('q', ''), kinds, limit)})
+
+
 #  Venues
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@validated(table_validator(Venue.updated_at), modified_since=False)
 def venues():
-  # TODO: replace with real venues data.
-  #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-  #venues = Venue.query.all() 
-  
-
-  data =[]
-  #get all the venues
-  venues = Venue.query.all()
-
-  #using a set to avoid duplicates
-  locations = set()
+  # num_upcoming_shows is read from the stored Venue counters
+  stream = streaming()
+  areas, next_cursor = venue_areas(page_size(stream), request.args.get('after'), stream)
+  return render_listing('pages/venues.html', stream, areas=areas, next_cursor=next_cursor)
 
-  for v in venues:
-    #add both city and state to locations
-    locations.add((v.city ,  v.state))
-  
-  #assigning the venues for each unique city_state
-  for location in locations:
-    data.append({"city": location[0], "state": location[1], "venues": [] })
-
-  for venue in venues:
-    num_upcoming_shows = 0
-    #get the shows associated to the upcoming show
-    shows = Show.query.filter_by(venue_id=venue.id).all()
-
-    for show in shows:
-      #condition to check if the show start_time is upcoming 
-      if show.start_time > datetime.now():
-        num_upcoming_shows += 1
-
-    for venue_location in data:
-      if venue.state == venue_location['state'] and venue.city == venue_location['city']:
-        venue_location['venues'].append({
-          "id" : venue.id,
-          "name" : venue.name,
-          "num_upcoming_shows" : num_upcoming_shows
-        })
-
-  
-  return render_template('pages/venues.html', areas=data);
-
-@app.route('/venues/search', methods=['POST'])
+@app.route('/venues/search', methods=['GET', 'POST'])
 def search_venues():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+  # case-insensitive, ranked partial match on name, city, state and genres
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  search_term = request.form.get('search_term')
-  results = Venue.query.filter(Venue.name.ilike(f'%{search_term}%')).all()
-  
-  response={
-    "count": len(results),
-    "data": results
-    
-  }
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
-
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-  # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
+  search_term = request.values.get('search_term', '')
+  offset = max(request.values.get('offset', 0, type=int), 0)
+  genres, match = requested_genres(), requested_match()
+  response = search(Venue, search_term, page_size(), offset, genres, match)
+  return render_template('pages/search_venues.html', results=response, search_term=search_term,
+                         genres=genres, match=match)
+
+def venue_detail(venue_id):
   venue = Venue.query.get(venue_id)
-  shows = Show.query.filter_by(venue_id = venue.id).all()
-  past_shows = []
-  upcoming_shows = []
-
-  for show in shows:
-    data = {
-      "artist_id" : show.artist_id,
-      "artist_name" : show.artist.name,
-      "artist_image_link": show.artist.image_link,
-      "start_time" : str(show.start_time),
-    }
-
-    if show.start_time  > datetime.now():
-      upcoming_shows.append(data)
-    else:
-      past_shows.append(data)
+  if venue is None:
+    abort(404)
 
+  now = datetime.now()
+  limit = show_history_limit()
+  upcoming_shows, upcoming_next = show_history(venue_shows_query(venue_id), venue_show_projection, True, now, limit, request.args.get('upcoming_after'))
+  past_shows, past_next = show_history(venue_shows_query(venue_id), venue_show_projection, False, now, limit, request.args.get('past_after'))
 
   data = {
     "id":venue.id,
@@ -213,13 +850,19 @@ def show_venue(venue_id):
     "image_link": venue.image_link,
     "past_shows":  past_shows,
     "upcoming_shows" : upcoming_shows,
-    "past_show_count": len(past_shows), 
-    "upcoming_shows_count": len(upcoming_shows),
+    "past_shows_next": past_next,
+    "upcoming_shows_next": upcoming_next,
+    "past_shows_count": venue.past_shows_count,
+    "upcoming_shows_count": venue.upcoming_shows_count,
 
   }
+  return data
 
-  #data = list(filter(lambda d: d['id'] == venue_id, [data1, data2, data3]))[0]
-  return render_template('pages/show_venue.html', venue=data)
+@app.route('/venues/<int:venue_id>')
+@validated(venue_validator)
+def show_venue(venue_id):
+  # shows the venue page with the given venue_id
+  return render_detail('venue', venue_id, venue_detail)
 
 #  Create Venue
 #  ----------------------------------------------------------------
@@ -253,6 +896,8 @@ def create_venue_submission():
       venue = Venue(name=name , city = city , state = state , address = address ,phone = phone, image_link = image_link ,seeking_talent=seeking_talent, genres = genres , facebook_link = facebook_link ,website_link = website_link ,seeking_description = seeking_description)
       db.session.add(venue)
       db.session.commit()
+      autocomplete_index.add('venue', venue.id, venue.name)
+      invalidate_facets('venue')
       
     
 
@@ -288,9 +933,14 @@ def delete_venue(venue_id):
 
     venue = Venue.query.get(venue_id)
     venue_name = venue.name
+    page_keys = venue_page_keys(venue.id)
 
     db.session.delete(venue)
     db.session.commit()
+    page_cache.delete(*page_keys)
+    autocomplete_index.remove('venue', int(venue_id))
+    invalidate_facets('venue')
+    show_listing_refresher.request()
   except : 
     error = True 
     db.session.rollback()
@@ -311,56 +961,33 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@validated(table_validator(Artist.updated_at), modified_since=False)
 def artists():
-  # TODO: replace with real data returned from querying the database
-  data = []
-  artists = Artist.query.all()
-  for artist in artists:
-    data.append({
-      "id": artist.id,
-      "name": artist.name
-    })
-  
-  return render_template('pages/artists.html', artists=data)
+  stream = streaming()
+  data, next_cursor = artist_listing(page_size(stream), request.args.get('after'), stream)
+  return render_listing('pages/artists.html', stream, artists=data, next_cursor=next_cursor)
 
-@app.route('/artists/search', methods=['POST'])
+@app.route('/artists/search', methods=['GET', 'POST'])
 def search_artists():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+  # case-insensitive, ranked partial match on name, city, state and genres
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
-  search_term = request.form.get('search_term','')
-  
-  result = Artist.query.filter(Artist.name.ilike(f'%{search_term}%')).all()
-
- 
-  response={
-    "count": len(result),
-    "data": result
-  }
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
-
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-  # shows the artist page with the given artist_id
-  # TODO: replace with real artist data from the artist table, using artist_id
+  search_term = request.values.get('search_term', '')
+  offset = max(request.values.get('offset', 0, type=int), 0)
+  genres, match = requested_genres(), requested_match()
+  response = search(Artist, search_term, page_size(), offset, genres, match)
+  return render_template('pages/search_artists.html', results=response, search_term=search_term,
+                         genres=genres, match=match)
+
+def artist_detail(artist_id):
   artist = Artist.query.get(artist_id)
-  shows = Show.query.filter_by(artist_id = artist.id).all()
-  past_shows = []
-  upcoming_shows = []
-
-  for show in shows:
-    data = {
-      "venue_id" : show.venue_id,
-      "venue_name" : show.venue.name,
-      "venue_image_link": show.venue.image_link,
-      "start_time" : str(show.start_time),
-    }
-
-    if show.start_time  > datetime.now():
-      upcoming_shows.append(data)
-    else:
-      past_shows.append(data)
+  if artist is None:
+    abort(404)
 
+  now = datetime.now()
+  limit = show_history_limit()
+  upcoming_shows, upcoming_next = show_history(artist_shows_query(artist_id), artist_show_projection, True, now, limit, request.args.get('upcoming_after'))
+  past_shows, past_next = show_history(artist_shows_query(artist_id), artist_show_projection, False, now, limit, request.args.get('past_after'))
 
   data = {
     "id":artist.id,
@@ -376,13 +1003,19 @@ def show_artist(artist_id):
     "image_link": artist.image_link,
     "past_shows":  past_shows,
     "upcoming_shows" : upcoming_shows,
-    "past_show_count": len(past_shows), 
-    "upcoming_shows_count": len(upcoming_shows),
+    "past_shows_next": past_next,
+    "upcoming_shows_next": upcoming_next,
+    "past_shows_count": artist.past_shows_count,
+    "upcoming_shows_count": artist.upcoming_shows_count,
 
   }
+  return data
 
-  
-  return render_template('pages/show_artist.html', artist=data)
+@app.route('/artists/<int:artist_id>')
+@validated(artist_validator)
+def show_artist(artist_id):
+  # shows the artist page with the given artist_id
+  return render_detail('artist', artist_id, artist_detail)
 
 #  Update
 #  ----------------------------------------------------------------
@@ -417,6 +1050,10 @@ def edit_artist_submission(artist_id):
       artist.seeking_description = request.form.get('seeking_description')
 
       db.session.commit()    
+      page_cache.delete(*artist_page_keys(artist_id))
+      autocomplete_index.add('artist', artist_id, artist.name)
+      invalidate_facets('artist')
+      show_listing_refresher.request()
       flash('Artist ' + artist.name + ' was successfully updated!')
       return redirect(url_for('show_artist', artist_id=artist_id))
     except:
@@ -468,6 +1105,10 @@ def edit_venue_submission(venue_id):
       venue.seeking_description = request.form.get('seeking_description')
 
       db.session.commit()
+      page_cache.delete(*venue_page_keys(venue_id))
+      autocomplete_index.add('venue', venue_id, venue.name)
+      invalidate_facets('venue')
+      show_listing_refresher.request()
       
     
 
@@ -521,6 +1162,8 @@ def create_artist_submission():
       venue = Artist(name=name , city = city , state = state  ,phone = phone, image_link = image_link ,looking_for_venues=looking_for_venues, genres = genres , facebook_link = facebook_link ,website_link = website_link ,seeking_description = seeking_description)
       db.session.add(venue)
       db.session.commit()
+      autocomplete_index.add('artist', venue.id, venue.name)
+      invalidate_facets('artist')
       
     
 
@@ -545,25 +1188,12 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@validated(table_validator(show_listing_view.c.updated_at), modified_since=False)
 def shows():
-  # displays list of shows at /shows
-  # TODO: replace with real venues data.
-
-  shows = Show.query.order_by(db.desc(Show.start_time)).all()
-
-  data = []
-
-  for show in shows:
-    data.append({
-    "venue_id" : show.venue_id,
-    "venue_name" : show.venue.name,
-    "artist_id" : show.artist_id,
-    "artist_name" : show.artist.name,
-    "artist_image_link": show.artist.image_link,
-    "start_time": str(show.start_time)
-    })
- 
-  return render_template('pages/shows.html', shows=data)
+  # displays list of shows at /shows, newest first
+  stream = streaming()
+  data, next_cursor = show_listing(page_size(stream), request.args.get('after'), stream)
+  return render_listing('pages/shows.html', stream, shows=data, next_cursor=next_cursor)
 
 @app.route('/shows/create')
 def create_shows():
@@ -571,30 +1201,435 @@ def create_shows():
   form = ShowForm()
   return render_template('forms/new_show.html', form=form)
 
+# constraints on Show and the form field a violation is reported on
+show_constraint_fields = {
+  'Show_venue_no_overlap': 'venue_id',
+  'Show_artist_no_overlap': 'artist_id',
+  'Show_venue_id_fkey': 'venue_id',
+  'Show_artist_id_fkey': 'artist_id',
+  'Show_end_after_start': 'duration',
+}
+
+def show_constraint_error(name, venue_id, artist_id, start_time, end_time):
+  """(field, message) for a Show constraint violation, None for other errors."""
+  field = show_constraint_fields.get(name)
+  if field is None:
+    return None
+  if name == 'Show_end_after_start':
+    return field, 'The show has to end after it starts.'
+  kind, id = ('Venue', venue_id) if field == 'venue_id' else ('Artist', artist_id)
+  if name.endswith('_fkey'):
+    return field, 'There is no %s with ID %s.' % (kind.lower(), id)
+  # the exclusion index finds the show that is in the way
+  column = getattr(Show, field)
+  booked = db.session.query(Show.start_time, Show.end_time) \
+    .filter(column == id) \
+    .filter(db.func.tsrange(Show.start_time, Show.end_time).op('&&')(db.func.tsrange(start_time, end_time))) \
+    .order_by(Show.start_time).first()
+  if booked is None:
+    return field, '%s %s is already booked at that time.' % (kind, id)
+  return field, booked_message(kind, id, booked.start_time, booked.end_time)
+
+def booked_message(kind, id, start_time, end_time):
+  return '%s %s is already booked from %s to %s.' % (
+    kind, id, format_datetime(start_time, 'full'), format_datetime(end_time, 'full'))
+
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
   # called to create new shows in the db, upon submitting new show listing form
-  # TODO: insert form data as a new Show record in the db, instead
+  form = ShowForm(request.form)
+  if not form.duration.validate(form):
+    return render_template('forms/new_show.html', form=form), 400
   try:
     artist_id = request.form.get("artist_id")
     venue_id = request.form.get("venue_id")
-    start_time = request.form.get("start_time")
+    start_time = dateutil.parser.parse(request.form.get("start_time"))
+    end_time = start_time + show_duration(form.duration.data)
 
-    show = Show(artist_id=artist_id, venue_id=venue_id , start_time=start_time)
+    show = Show(artist_id=artist_id, venue_id=venue_id , start_time=start_time, end_time=end_time)
     db.session.add(show)
     db.session.commit()
+    page_cache.delete('venue:%d' % int(venue_id), 'artist:%d' % int(artist_id))
+    show_listing_refresher.request()
     flash('Show was successfully listed!')
   # on successful db insert, flash success
+  except exc.IntegrityError as e:
+    db.session.rollback()
+    error = show_constraint_error(constraint_name(e), venue_id, artist_id, start_time, end_time)
+    flash('Show was not successfully listed!')
+    if error is not None:
+      # double bookings and unknown ids go back to the form, next to the field
+      field, message = error
+      getattr(form, field).errors = [message]
+      return render_template('forms/new_show.html', form=form), 409
   except:
      db.session.rollback()
      flash('Show was not successfully listed!')
   finally:
      db.session.close()
-  # TODO: on unsuccessful db insert, flash an error instead.
-  # e.g., flash('An error occurred. Show could not be listed.')
-  # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
   return render_template('pages/home.html')
 
+def existing_references(artist_ids, venue_ids):
+  # ('artist', id) / ('venue', id) pairs that exist, in one query
+  artists = db.session.query(db.literal('artist'), Artist.id).filter(Artist.id.in_(artist_ids))
+  venues = db.session.query(db.literal('venue'), Venue.id).filter(Venue.id.in_(venue_ids))
+  return {(ref, id) for ref, id in artists.union_all(venues)}
+
+def batch_overlaps(shows, errors):
+  # shows of one venue or artist within the batch overlapping each other,
+  # found by sorting on (id, start_time) and comparing with the latest end
+  for ref in ('venue', 'artist'):
+    key = ref + '_id'
+    latest = None
+    for number, show in sorted(shows.items(), key=lambda item: (item[1][key], item[1]['start_time'], item[0])):
+      if latest is not None and latest[1][key] == show[key] and show['start_time'] < latest[1]['end_time']:
+        errors.setdefault(number, []).append('overlaps line %d at the same %s' % (latest[0], ref))
+      if latest is None or latest[1][key] != show[key] or show['end_time'] > latest[1]['end_time']:
+        latest = (number, show)
+
+def booked_overlaps(shows, errors):
+  # shows already booked in the way of the batch, one query joining it as a
+  # VALUES list against the indexes of the Show exclusion constraints
+  batch = db.values(
+    db.column('number', db.Integer),
+    db.column('venue_id', db.Integer),
+    db.column('artist_id', db.Integer),
+    db.column('start_time', db.DateTime),
+    db.column('end_time', db.DateTime),
+    name='batch',
+  ).data([(number, show['venue_id'], show['artist_id'], show['start_time'], show['end_time'])
+          for number, show in shows.items()])
+  queries = []
+  for ref in ('venue', 'artist'):
+    column = getattr(Show, ref + '_id')
+    overlap = db.func.tsrange(Show.start_time, Show.end_time).op('&&')(
+      db.func.tsrange(batch.c.start_time, batch.c.end_time))
+    queries.append(db.session.query(batch.c.number, db.literal(ref.title()), column, Show.start_time, Show.end_time)
+                   .select_from(batch).join(Show, db.and_(column == batch.c[ref + '_id'], overlap)))
+  for number, kind, id, start_time, end_time in queries[0].union_all(queries[1]):
+    errors.setdefault(number, []).append(booked_message(kind, id, start_time, end_time))
+
+def schedule_shows(rows):
+  """Validates a batch of (number, row) shows and inserts all of them or none.
+
+  Rows are cleaned like `flask import` rows, but name their artist and venue
+  by id. Ids are checked with one query, overlaps within the batch in
+  Python and with existing shows with one more; only a clean batch is
+  inserted, in one multi-row INSERT and transaction. Returns the number of
+  shows created and the errors by row number.
+  """
+  duration = app.config.get('SHOW_DEFAULT_DURATION', 120)
+  shows, errors = {}, {}
+  for number, row in rows:
+    cleaned, row_errors = clean_show(row, default_duration=duration)
+    row_errors += ['missing %s_id' % ref for ref in ('artist', 'venue') if ref in cleaned]
+    if row_errors:
+      errors[number] = row_errors
+    else:
+      shows[number] = cleaned
+  if not shows:
+    return 0, errors
+
+  known = existing_references({show['artist_id'] for show in shows.values()},
+                              {show['venue_id'] for show in shows.values()})
+  for number, show in list(shows.items()):
+    unknown = ['unknown %s_id %d' % (ref, show[ref + '_id']) for ref in ('artist', 'venue')
+               if (ref, show[ref + '_id']) not in known]
+    if unknown:
+      errors[number] = unknown
+      del shows[number]
+  batch_overlaps(shows, errors)
+  if shows:
+    booked_overlaps(shows, errors)
+  if errors:
+    db.session.rollback()
+    return 0, errors
+
+  try:
+    db.session.execute(Show.__table__.insert(), list(shows.values()))
+    db.session.commit()
+  except exc.IntegrityError:
+    # booked by someone else since the check, say where
+    db.session.rollback()
+    booked_overlaps(shows, errors)
+    db.session.rollback()
+    if not errors:
+      raise
+    return 0, errors
+  page_cache.delete(*{'venue:%d' % show['venue_id'] for show in shows.values()} |
+                    {'artist:%d' % show['artist_id'] for show in shows.values()})
+  show_listing_refresher.request()
+  return len(shows), errors
+
+def batch_rows(text):
+  # one show per line: artist_id, venue_id, start_time[, duration]
+  fields = ('artist_id', 'venue_id', 'start_time', 'duration')
+  for number, line in enumerate(text.splitlines(), 1):
+    if line.strip():
+      values = next(csv.reader([line], skipinitialspace=True))
+      yield number, dict(zip(fields, values))
+
+@app.route('/shows/batch')
+def create_show_batch():
+  return render_template('forms/new_show_batch.html', form=ShowBatchForm(), errors={})
+
+@app.route('/shows/batch', methods=['POST'])
+def create_show_batch_submission():
+  # many shows at once, e.g. a tour, listed together or not at all
+  form = ShowBatchForm(request.form)
+  if not form.validate():
+    return render_template('forms/new_show_batch.html', form=form, errors={}), 400
+  rows = list(batch_rows(form.shows.data))
+  if len(rows) > app.config.get('SHOW_BATCH_MAX_ROWS', 500):
+    form.shows.errors = ['At most %d shows at once.' % app.config.get('SHOW_BATCH_MAX_ROWS', 500)]
+    return render_template('forms/new_show_batch.html', form=form, errors={}), 400
+  if form.duration.data:
+    rows = [(number, dict(row, duration=row.get('duration') or str(form.duration.data))) for number, row in rows]
+  created, errors = schedule_shows(rows)
+  if errors:
+    flash('No shows were listed, please correct the lines below.')
+    return render_template('forms/new_show_batch.html', form=form, errors=errors), 422
+  flash('%d shows were successfully listed!' % created)
+  return render_template('pages/home.html')
+
+#  Debug
+#  ----------------------------------------------------------------
+
+if sql_instrumentation is not None:
+  @app.route('/_debug/sql')
+  def sql_stats():
+    # per-endpoint query counts and timings collected since startup / reset
+    if request.args.get('reset'):
+      sql_instrumentation.reset()
+    return render_template('pages/sql_stats.html', endpoints=sql_instrumentation.summary())
+
+if app.config.get('POOL_STATS'):
+  @app.route('/_debug/pool')
+  def pool_status():
+    replicas = app.extensions.get('replicas')
+    return jsonify({
+      "primary": pool_stats(db.engine),
+      "replicas": [pool_stats(engine) for engine in replicas.engines] if replicas else [],
+    })
+
+if app.config.get('AUTOCOMPLETE_METRICS'):
+  @app.route('/_debug/autocomplete')
+  def autocomplete_metrics():
+    # entry count and approximate resident size of this worker's index
+    return jsonify(autocomplete_index.memory())
+
+if app.config.get('SHOW_LISTING_METRICS'):
+  @app.route('/_debug/show-listing')
+  def show_listing_metrics():
+    # refresh count / duration and how long /shows has lagged behind writes
+    return jsonify(show_listing_refresher.metrics())
+
+#  API
+#  ----------------------------------------------------------------
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+def plain(value):
+  # projection records are namedtuples, which json would write as arrays
+  if hasattr(value, '_asdict'):
+    return {key: plain(item) for key, item in value._asdict().items()}
+  if isinstance(value, dict):
+    return {key: plain(item) for key, item in value.items()}
+  if isinstance(value, list):
+    return [plain(item) for item in value]
+  return value
+
+def select_fields(item):
+  # ?fields=id,name trims every object down to the listed keys
+  item = plain(item)
+  fields = request.args.get('fields')
+  if not fields:
+    return item
+  return {field: item[field] for field in fields.split(',') if field in item}
+
+def json_default(value):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  raise TypeError(repr(value))
+
+def api_response(data, next_cursor=None, paged=False, **extra):
+  if paged:
+    payload = {"data": [select_fields(item) for item in data], "next": next_cursor}
+  else:
+    payload = {"data": select_fields(data)}
+  payload.update(extra)
+  body = json.dumps(payload, separators=(',', ':'), default=json_default)
+  response = Response(body, mimetype='application/json')
+  # strong validator over the exact bytes, clients revalidate with If-None-Match
+  response.set_etag(hashlib.sha1(body.encode('utf-8')).hexdigest())
+  response.cache_control.no_cache = True
+  return response.make_conditional(request)
+
+@api.route('/venues')
+def api_venues():
+  data, next_cursor = venue_listing(page_size(), request.args.get('after'))
+  return api_response(data, next_cursor, paged=True)
+
+def api_search(model):
+  # ?q=term&genre=Jazz&genre=Blues&match=all|any, next is an offset here
+  offset = max(request.args.get('offset', 0, type=int), 0)
+  results = search(model, request.args.get('q', ''), page_size(), offset, requested_genres(), requested_match())
+  return api_response(results['data'], results['next_offset'], paged=True,
+                      count=results['count'], facets=results['facets'])
+
+@api.route('/venues/search')
+def api_search_venues():
+  return api_search(Venue)
+
+@api.route('/venues/<int:venue_id>')
+def api_venue(venue_id):
+  return api_response(venue_detail(venue_id))
+
+@api.route('/artists')
+def api_artists():
+  data, next_cursor = artist_listing(page_size(), request.args.get('after'))
+  return api_response(data, next_cursor, paged=True)
+
+@api.route('/artists/search')
+def api_search_artists():
+  return api_search(Artist)
+
+@api.route('/artists/<int:artist_id>')
+def api_artist(artist_id):
+  return api_response(artist_detail(artist_id))
+
+@api.route('/shows')
+def api_shows():
+  data, next_cursor = show_listing(page_size(), request.args.get('after'))
+  return api_response(data, next_cursor, paged=True)
+
+def clock(value):
+  # 'HH:MM' as an offset into the day, '24:00' is the end of it
+  hours, minutes = (int(part) for part in value.split(':'))
+  if not (0 <= hours < 24 and 0 <= minutes < 60 or (hours, minutes) == (24, 0)):
+    raise ValueError(value)
+  return timedelta(hours=hours, minutes=minutes)
+
+def iso_datetime(value):
+  # '2026-11-07T19:00', with a Z or +01:00 offset converted to local time
+  return local_time(dateutil.parser.isoparse(value))
+
+def requested_period():
+  # ?date=2026-11-07[&from=19:00&to=23:00], a to before from ends the next
+  # day, or ?start=...&end=... as ISO datetimes
+  try:
+    if request.args.get('start'):
+      start = iso_datetime(request.args['start'])
+      end = iso_datetime(request.args['end']) if request.args.get('end') else start + show_duration()
+    else:
+      day = datetime.strptime(request.args['date'], '%Y-%m-%d')
+      start = day + clock(request.args.get('from', '00:00'))
+      end = day + clock(request.args.get('to', '24:00'))
+      if end <= start:
+        end += timedelta(days=1)
+    if end <= start:
+      raise ValueError(end)
+  except (KeyError, TypeError, ValueError, OverflowError):
+    abort(400)
+  return start, end
+
+def window_values(data):
+  """(starts, ends, week minutes) rows for a posted availability window.
+
+  One-off: {"starts", "ends"}. Weekly: {"weekday": 0-6 (Monday 0), "from",
+  "to"} plus optional "starts" / "ends" dates it is limited to; one that
+  runs past Sunday midnight is stored as two rows.
+  """
+  if data.get('weekday') not in (None, ''):
+    weekday = int(data['weekday'])
+    if not 0 <= weekday < 7:
+      raise ValueError(weekday)
+    # any Monday will do, only the position in the week is kept
+    day = datetime(2024, 1, 1) + timedelta(days=weekday)
+    start, end = day + clock(data['from']), day + clock(data['to'])
+    if end <= start:
+      end += timedelta(days=1)
+    starts = iso_datetime(data['starts']) if data.get('starts') else \
+      datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    ends = iso_datetime(data['ends']) if data.get('ends') else None
+    if ends is not None and ends <= starts:
+      raise ValueError(ends)
+    return [(starts, ends, bounds) for bounds in week_minutes(start, end)]
+  starts, ends = iso_datetime(data['starts']), iso_datetime(data['ends'])
+  if ends <= starts:
+    raise ValueError(ends)
+  return [(starts, ends, None)]
+
+def api_availability(model, id):
+  # GET lists the windows of a venue / artist, POST adds one
+  if db.session.query(model.id).filter(model.id == id).first() is None:
+    abort(404)
+  if request.method == 'GET':
+    return api_response(availability_windows(model, id), paged=True)
+  try:
+    rows = window_values(request.get_json(silent=True) or request.form)
+  except (KeyError, TypeError, ValueError, OverflowError):
+    abort(400)
+  for starts, ends, bounds in rows:
+    window = Availability(period=db.func.tsrange(starts, ends),
+                          week_minutes=db.func.int4range(*bounds) if bounds else None)
+    setattr(window, owner_column(model).key, id)
+    db.session.add(window)
+  db.session.commit()
+  response = api_response(availability_windows(model, id), paged=True)
+  response.status_code = 201
+  return response
+
+def api_available(model):
+  # ?date / ?start as for requested_period(), &city=&state=&genre=&match=
+  start, end = requested_period()
+  data, next_cursor = available(model, start, end, request.args.get('city'), request.args.get('state'),
+                                requested_genres(), requested_match(), page_size(), request.args.get('after'))
+  return api_response(data, next_cursor, paged=True)
+
+@api.route('/shows/batch', methods=['POST'])
+def api_show_batch():
+  # [{"artist_id", "venue_id", "start_time", "duration" or "end_time"}, ...]
+  # or {"shows": [...]}, rows are numbered from 1 in the errors
+  body = request.get_json(silent=True)
+  shows = body.get('shows') if isinstance(body, dict) else body
+  if not isinstance(shows, list) or not all(isinstance(row, dict) for row in shows):
+    abort(400)
+  if len(shows) > app.config.get('SHOW_BATCH_MAX_ROWS', 500):
+    abort(413)
+  created, errors = schedule_shows(list(enumerate(shows, 1)))
+  if errors:
+    return jsonify({"errors": [{"row": number, "errors": row_errors}
+                               for number, row_errors in sorted(errors.items())]}), 422
+  response = api_response({"created": created})
+  response.status_code = 201
+  return response
+
+@api.route('/venues/<int:venue_id>/availability', methods=['GET', 'POST'])
+def api_venue_availability(venue_id):
+  return api_availability(Venue, venue_id)
+
+@api.route('/artists/<int:artist_id>/availability', methods=['GET', 'POST'])
+def api_artist_availability(artist_id):
+  return api_availability(Artist, artist_id)
+
+@api.route('/availability/<int:window_id>', methods=['DELETE'])
+def api_delete_availability(window_id):
+  if not Availability.query.filter_by(id=window_id).delete():
+    abort(404)
+  db.session.commit()
+  return '', 204
+
+@api.route('/venues/available')
+def api_available_venues():
+  return api_available(Venue)
+
+@api.route('/artists/available')
+def api_available_artists():
+  return api_available(Artist)
+
+app.register_blueprint(api)
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -614,6 +1649,317 @@ if not app.debug:
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+def rollover_shows(now=None):
+  # moves the shows that started since the last tick from the upcoming to the
+  # past counters, the range is read through the start_time index. The row
+  # lock on the tick serialises this with the Show counter triggers.
+  now = now or datetime.now()
+  tick = db.session.query(ShowRollover).with_for_update().get(1)
+  if tick.rolled_over_at >= now:
+    db.session.rollback()
+    return 0
+
+  started = db.and_(Show.start_time > tick.rolled_over_at, Show.start_time <= now)
+  moved = db.session.query(db.func.count(Show.id)).filter(started).scalar()
+  page_keys = []
+  if moved:
+    for kind, model, column in (('venue', Venue, Show.venue_id), ('artist', Artist, Show.artist_id)):
+      counts = db.session.query(column.label('id'), db.func.count(Show.id).label('shows')) \
+        .filter(started).group_by(column).subquery()
+      updated = db.session.execute(
+        model.__table__.update()
+          .where(model.id == counts.c.id)
+          .values(
+            upcoming_shows_count=model.upcoming_shows_count - counts.c.shows,
+            past_shows_count=model.past_shows_count + counts.c.shows,
+          )
+          .returning(model.id)
+      )
+      page_keys += ['%s:%d' % (kind, row.id) for row in updated]
+  tick.rolled_over_at = now
+  db.session.commit()
+  # the cached pages show the old counters under the new updated_at validators
+  page_cache.delete(*page_keys)
+  return moved
+
+@app.cli.command('rollover-shows')
+def rollover_shows_command():
+  """Moves shows that have started from the upcoming to the past counters."""
+  click.echo('%d shows rolled over' % rollover_shows())
+
+def start_rollover_scheduler(interval):
+  def run():
+    while True:
+      time.sleep(interval)
+      with app.app_context():
+        try:
+          rollover_shows()
+        except exc.SQLAlchemyError:
+          db.session.rollback()
+          app.logger.exception('show roll-over failed')
+        finally:
+          db.session.remove()
+
+  thread = threading.Thread(target=run, name='show-rollover', daemon=True)
+  thread.start()
+  return thread
+
+@app.before_first_request
+def start_rollover():
+  # every worker runs its own ticks, the tick row lock keeps them from
+  # rolling the same shows over twice. Use `flask rollover-shows` from cron
+  # instead by setting SHOW_ROLLOVER_INTERVAL to 0.
+  interval = app.config.get('SHOW_ROLLOVER_INTERVAL')
+  if interval:
+    start_rollover_scheduler(interval)
+
+def walk_plan(plan):
+  yield plan
+  for child in plan.get('Plans', []):
+    yield from walk_plan(child)
+
+def main_queries(venue_id, artist_id, now=None):
+  # (route, call) pairs running the main queries of the listing, search,
+  # detail and availability views the way the views do. The filters are as
+  # selective as a real visitor's, where an index is the better plan.
+  now = now or datetime.now()
+  evening = (now + timedelta(days=1)).replace(hour=19, minute=0, second=0, microsecond=0)
+  limit = app.config.get('PAGE_SIZE')
+  return [
+    ('/venues', lambda: venue_areas(limit)),
+    ('/artists', lambda: artist_listing(limit)),
+    ('/shows', lambda: show_listing(limit)),
+    ('/venues/search?search_term=hall 12', lambda: search(Venue, 'hall 12', limit)),
+    ('/artists/search?search_term=band 12', lambda: search(Artist, 'band 12', limit)),
+    ('/venues/search?genre=Blues&genre=Jazz&match=all', lambda: search(Venue, '', limit, genres=['Blues', 'Jazz'], match='all')),
+    ('/artists/search?genre=Blues&genre=Jazz&match=all', lambda: search(Artist, '', limit, genres=['Blues', 'Jazz'], match='all')),
+    ('/venues/%d' % venue_id, lambda: venue_detail(venue_id)),
+    ('/artists/%d' % artist_id, lambda: artist_detail(artist_id)),
+    ('/api/v1/artists/available?city=Austin&state=TX', lambda: available(Artist, evening, evening + timedelta(hours=4), city='Austin', state='TX', limit=limit)),
+    ('/api/v1/venues/available?city=Austin&genre=Jazz', lambda: available(Venue, evening, evening + timedelta(hours=4), city='Austin', genres=['Jazz'], limit=limit)),
+  ]
+
+def seq_scans(statements, min_rows=1000):
+  """(statement, tables) for each statement whose plan reads a table or view
+  of at least min_rows (estimated) rows with a Seq Scan.
+
+  Plans come from plain EXPLAIN with the planner's normal settings, so they
+  are only telling on a database with realistic data and fresh statistics.
+  Smaller tables are best read whole and are left out.
+  """
+  found = []
+  connection = db.engine.raw_connection()
+  try:
+    cursor = connection.cursor()
+    cursor.execute("SELECT relname FROM pg_class WHERE relkind IN ('r', 'm') AND reltuples >= %s", (min_rows,))
+    large = {row[0] for row in cursor}
+    for statement, parameters in statements:
+      if not statement.lstrip().upper().startswith('SELECT'):
+        continue
+      cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+      plan = cursor.fetchone()[0][0]['Plan']
+      tables = [node['Relation Name'] for node in walk_plan(plan)
+                if node['Node Type'] == 'Seq Scan' and node['Relation Name'] in large]
+      if tables:
+        found.append((statement, tables))
+  finally:
+    connection.rollback()
+    connection.close()
+  return found
+
+def main_query_statements(call):
+  # the statements call() sends, run in a request context like a view
+  statements = []
+  def record(conn, cursor, statement, parameters, context, executemany):
+    statements.append((statement, parameters))
+
+  db.event.listen(db.engine, 'before_cursor_execute', record)
+  try:
+    with app.test_request_context():
+      call()
+      db.session.remove()
+  finally:
+    db.event.remove(db.engine, 'before_cursor_execute', record)
+  return statements
+
+@app.cli.command('explain-routes')
+@click.option('--min-rows', default=1000, show_default=True, help='Ignore seq scans of smaller tables.')
+def explain_routes(min_rows):
+  """Fails if a route's main query plans a seq scan on a large table.
+
+  Meant for a database with production-like data; tests/test_query_plans.py
+  runs the same check on a seeded one.
+  """
+  venue = db.session.query(Venue.id).order_by(Venue.id).first()
+  artist = db.session.query(Artist.id).order_by(Artist.id).first()
+  db.session.close()
+  if venue is None or artist is None:
+    raise click.ClickException('needs at least one venue and one artist')
+
+  failures = 0
+  for route, call in main_queries(venue.id, artist.id):
+    scans = seq_scans(main_query_statements(call), min_rows)
+    for statement, tables in scans:
+      click.echo('SEQ SCAN %s on %s: %s' % (route, ', '.join(tables), ' '.join(statement.split())))
+    if not scans:
+      click.echo('ok       %s' % route)
+    failures += len(scans)
+  if failures:
+    sys.exit(1)
+
+def resolve_references(model, rows, ref):
+  # one query for the ids and one for the names referenced by a whole batch
+  ids = {row[ref + '_id'] for row in rows if ref + '_id' in row}
+  names = {row[ref] for row in rows if ref in row}
+  known_ids, by_name = set(), {}
+  if ids:
+    known_ids = {row.id for row in db.session.query(model.id).filter(model.id.in_(ids))}
+  if names:
+    for row in db.session.query(model.id, model.name).filter(model.name.in_(names)):
+      by_name.setdefault(row.name, []).append(row.id)
+  return known_ids, by_name
+
+def resolve_shows(values, reject):
+  refs = {
+    'artist': resolve_references(Artist, [cleaned for line, row, cleaned in values], 'artist'),
+    'venue': resolve_references(Venue, [cleaned for line, row, cleaned in values], 'venue'),
+  }
+  resolved = []
+  for line, row, cleaned in values:
+    errors = []
+    for ref, (known_ids, by_name) in refs.items():
+      if ref in cleaned:
+        name = cleaned.pop(ref)
+        ids = by_name.get(name, [])
+        if len(ids) == 1:
+          cleaned[ref + '_id'] = ids[0]
+        else:
+          errors.append('%s %s %s' % ('ambiguous' if ids else 'unknown', ref, name))
+      elif cleaned[ref + '_id'] not in known_ids:
+        errors.append('unknown %s_id %d' % (ref, cleaned[ref + '_id']))
+    if errors:
+      reject(line, row, errors)
+    else:
+      resolved.append((line, row, cleaned))
+  return resolved
+
+def insert_rows_one_by_one(model, values, reject):
+  # returns the number of rows inserted, the others are rejected with the
+  # constraint they violate
+  loaded = 0
+  for line, row, cleaned in values:
+    try:
+      with db.session.begin_nested():
+        db.session.execute(model.__table__.insert(), cleaned)
+      loaded += 1
+    except exc.IntegrityError as e:
+      error = show_constraint_error(constraint_name(e), cleaned['venue_id'], cleaned['artist_id'],
+                                    cleaned['start_time'], cleaned['end_time'])
+      reject(line, row, [error[1] if error else str(getattr(e, 'orig', e))])
+  db.session.commit()
+  return loaded
+
+@app.cli.command('build-assets')
+@click.option('--brotli/--no-brotli', 'use_brotli', default=True, show_default=True,
+              help='Also write .br files (needs the brotli package).')
+@click.option('--clean', is_flag=True, help='Remove the files of earlier builds first.')
+def build_assets_command(use_brotli, clean):
+  """Fingerprints and pre-compresses static/ into ASSET_BUILD_FOLDER.
+
+  Every file gets a content hash in its name and, where it pays off, .gz
+  and .br variants; manifest.json maps the static/ paths to the built ones
+  for asset_url().
+  """
+  from assets import brotli
+  if use_brotli and brotli is None:
+    click.echo('brotli is not installed, writing gzip variants only', err=True)
+  started = time.perf_counter()
+  sizes = build_assets(app.static_folder, app.config['ASSET_BUILD_FOLDER'], use_brotli, clean)
+  asset_manifest.load()
+  totals = {}
+  for encodings in sizes.values():
+    for encoding in ('identity', 'gzip', 'br'):
+      # files without a variant are sent as they are
+      totals[encoding] = totals.get(encoding, 0) + encodings.get(encoding, encodings['identity'])
+  click.echo('%d files in %.1fs, %s' % (len(sizes), time.perf_counter() - started, ', '.join(
+    '%s %.1f KiB' % (encoding, size / 1024.0) for encoding, size in totals.items()
+    if encoding != 'br' or (use_brotli and brotli is not None))))
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per transaction.')
+@click.option('--rejects', type=click.File('w', encoding='utf-8'), help='Write rejected rows to this JSONL file.')
+def import_rows(kind, source, format, batch_size, rejects):
+  """Bulk loads venues, artists or shows from a CSV or JSONL file.
+
+  Rows are validated with the state and genre choices from forms.py and
+  inserted with one multi-row INSERT and one commit per batch. Shows take an
+  end_time or a duration in minutes (SHOW_DEFAULT_DURATION if neither), a
+  batch with double bookings is retried row by row.
+  """
+  format = format or ('csv' if source.name.endswith('.csv') else 'jsonl')
+  model, clean = {
+    'venues': (Venue, clean_venue),
+    'artists': (Artist, clean_artist),
+    'shows': (Show, functools.partial(clean_show, default_duration=app.config.get('SHOW_DEFAULT_DURATION', 120))),
+  }[kind]
+  counts = {'loaded': 0, 'rejected': 0}
+  started = time.perf_counter()
+
+  def reject(line, row, errors):
+    counts['rejected'] += 1
+    if rejects:
+      rejects.write(json.dumps({"line": line, "errors": errors, "row": row}, default=str) + '\n')
+    elif counts['rejected'] <= 20:
+      click.echo('line %d rejected: %s' % (line, '; '.join(errors)), err=True)
+
+  for batch in batches(read_rows(source, format), batch_size):
+    values = []
+    for line, row, error in batch:
+      cleaned, errors = clean(row) if error is None else (None, [error])
+      if errors:
+        reject(line, row, errors)
+      else:
+        values.append((line, row, cleaned))
+    if kind == 'shows' and values:
+      values = resolve_shows(values, reject)
+
+    if values:
+      try:
+        db.session.execute(model.__table__.insert(), [cleaned for line, row, cleaned in values])
+        db.session.commit()
+        counts['loaded'] += len(values)
+      except exc.IntegrityError as e:
+        db.session.rollback()
+        if kind != 'shows':
+          for line, row, cleaned in values:
+            reject(line, row, ['batch failed: %s' % getattr(e, 'orig', e)])
+        else:
+          # ids were resolved above, so this is a double booking: one
+          # savepoint per row keeps the good rows and names the others
+          counts['loaded'] += insert_rows_one_by_one(model, values, reject)
+      except exc.SQLAlchemyError as e:
+        db.session.rollback()
+        for line, row, cleaned in values:
+          reject(line, row, ['batch failed: %s' % getattr(e, 'orig', e)])
+
+    elapsed = time.perf_counter() - started
+    click.echo('%d loaded, %d rejected, %.0f rows/s' % (
+      counts['loaded'], counts['rejected'], (counts['loaded'] + counts['rejected']) / elapsed))
+
+  db.session.close()
+  if counts['loaded']:
+    page_cache.clear()
+    # this process exits right away, so refresh now instead of debouncing
+    show_listing_refresher.run_now()
+  click.echo('done in %.1fs' % (time.perf_counter() - started))
+
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
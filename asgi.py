@@ -0,0 +1,177 @@
+"""ASGI entry point with an async database path for read-only pages.
+
+    uvicorn asgi:application --workers 2
+
+Requests for the read-only ASYNC_ENDPOINTS are served on the event loop:
+the regular Flask view runs in a greenlet through AsyncSession.run_sync, with
+the app's scoped session pointed at an asyncpg connection, so the models,
+queries and templates are the ones app.py already uses but a request waiting
+on PostgreSQL no longer holds a thread. Every other request (the create /
+edit forms, deletes, static files) is handed to a pool of
+SYNC_WORKER_THREADS threads and runs exactly as under `app.run()`.
+
+Needs asyncpg and an ASGI server such as uvicorn. Views on the async path
+must not block on anything but the database; with PAGE_CACHE_BACKEND=redis
+cache round-trips still block the loop.
+"""
+import io
+import sys
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.util import await_only
+from werkzeug.exceptions import HTTPException
+
+from app import app, db
+
+
+def async_database_url(config):
+    url = make_url(config.get('ASYNC_DATABASE_URL') or config['SQLALCHEMY_DATABASE_URI'])
+    # libpq only query options mean nothing to asyncpg
+    query = {key: value for key, value in url.query.items() if key not in ('sslmode', 'application_name')}
+    return url.set(drivername='postgresql+asyncpg', query=query)
+
+
+def async_engine_options(config):
+    options = {key: value for key, value in (config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}).items()
+               if key != 'connect_args'}
+    connect_args = {}
+    if config.get('DB_TRANSACTION_POOLER'):
+        # prepared statements do not survive a transaction pooler switching
+        # server connections, timeouts come from the per-transaction SET LOCAL
+        connect_args['statement_cache_size'] = 0
+        connect_args['prepared_statement_cache_size'] = 0
+    else:
+        connect_args['server_settings'] = {'statement_timeout': str(config.get('DB_STATEMENT_TIMEOUT', 0))}
+    options['connect_args'] = connect_args
+    return options
+
+
+async_engine = create_async_engine(async_database_url(app.config), **async_engine_options(app.config))
+sync_executor = ThreadPoolExecutor(app.config.get('SYNC_WORKER_THREADS', 15), thread_name_prefix='sync-view')
+
+
+def environ_for(scope, body):
+    """WSGI environ for an ASGI http scope."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/%s' % scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name, value = name.decode('latin1').upper().replace('-', '_'), value.decode('latin1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = environ[name] + ',' + value if name in environ else value
+    return environ
+
+
+def run_view(environ, emit):
+    """Runs the Flask app for one request, handing ASGI messages to emit.
+
+    Chunks go out as the app yields them, so streamed templates reach the
+    client while the rest of the page is still being rendered.
+    """
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'], started['headers'] = status, headers
+
+    result = app.wsgi_app(environ, start_response)
+    try:
+        emit({
+            'type': 'http.response.start',
+            'status': int(started['status'].split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin1'), value.encode('latin1'))
+                        for name, value in started['headers']],
+        })
+        for chunk in result:
+            if chunk:
+                emit({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        emit({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+
+
+def run_view_in_session(session, environ, send):
+    # the scoped session is keyed by greenlet and run_sync gives every
+    # request its own, so db.session / Model.query inside the view resolve
+    # to this request's asyncpg backed session. await_only suspends the
+    # greenlet, not the loop, while a chunk is sent.
+    db.session.registry.set(session)
+    try:
+        run_view(environ, lambda message: await_only(send(message)))
+    finally:
+        db.session.registry.clear()
+
+
+def async_request(scope):
+    """True if the request can be served on the event loop."""
+    adapter = app.url_map.bind('localhost', script_name=scope.get('root_path') or None)
+    try:
+        endpoint, args = adapter.match(scope['path'], method=scope['method'])
+    except HTTPException:
+        return False
+    if endpoint not in app.config.get('ASYNC_ENDPOINTS', ()):
+        return False
+    return scope['method'] in ('GET', 'HEAD') or endpoint in app.config.get('READ_ONLY_ENDPOINTS', ())
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_engine.dispose()
+            sync_executor.shutdown(wait=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    environ = environ_for(scope, await read_body(receive))
+    if async_request(scope):
+        async with AsyncSession(async_engine) as session:
+            await session.run_sync(run_view_in_session, environ, send)
+    else:
+        loop = asyncio.get_running_loop()
+
+        def emit(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        await loop.run_in_executor(sync_executor, run_view, environ, emit)
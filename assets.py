@@ -0,0 +1,139 @@
+import os
+import re
+import gzip
+import json
+import shutil
+import hashlib
+import posixpath
+
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# already compressed formats, not worth a .gz / .br next to them
+COMPRESSED = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.ico', '.woff', '.woff2', '.gz', '.br', '.zip'}
+# url(...) references inside stylesheets
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# the content hash fingerprinted() puts before the extension
+FINGERPRINT = re.compile(r'\.[0-9a-f]{12}(\.[^./]+)?$')
+
+
+def fingerprinted(path, content):
+    root, ext = posixpath.splitext(path)
+    return '%s.%s%s' % (root, hashlib.sha256(content).hexdigest()[:12], ext)
+
+
+def rewrite_css(path, content, assets):
+    """Points relative url() references of a stylesheet at the fingerprinted
+    files, references to files that were not built are left alone."""
+    base = posixpath.dirname(path)
+
+    def replace(match):
+        quote, url = match.groups()
+        if url.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+        target, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        built = assets.get(posixpath.normpath(posixpath.join(base, target)))
+        if built is None:
+            return match.group(0)
+        relative = posixpath.relpath(built, base) if base else built
+        return 'url(%s%s%s%s)' % (quote, relative, suffix, quote)
+
+    return CSS_URL.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+
+def compress(content, use_brotli=True):
+    """{encoding: bytes} for the encodings that make the file smaller."""
+    variants = {'gzip': gzip.compress(content, compresslevel=9, mtime=0)}
+    if use_brotli and brotli is not None:
+        variants['br'] = brotli.compress(content, quality=11)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(content) * 0.9}
+
+
+def build_assets(source, target, use_brotli=True, clean=False):
+    """Copies every file under source to target with a content hash in its
+    name, next to .gz / .br variants, and writes target/manifest.json.
+
+    Stylesheets are built last, with their url() references rewritten, so
+    their hash also covers the fonts and images they point at. Files of
+    earlier builds stay, for pages still rendered by the previous release,
+    unless clean is set; the manifest is replaced last, in one rename.
+    """
+    if clean and os.path.isdir(target):
+        shutil.rmtree(target)
+    files = []
+    for root, dirs, names in os.walk(source):
+        dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+        for name in sorted(names):
+            if not name.startswith('.'):
+                path = os.path.relpath(os.path.join(root, name), source).replace(os.sep, '/')
+                files.append(path)
+    files.sort(key=lambda path: (path.endswith('.css'), path))
+
+    assets, sizes = {}, {}
+    for path in files:
+        with open(os.path.join(source, path), 'rb') as asset:
+            content = asset.read()
+        if path.endswith('.css'):
+            content = rewrite_css(path, content, assets)
+        built = fingerprinted(path, content)
+        variants = {} if posixpath.splitext(path)[1].lower() in COMPRESSED else compress(content, use_brotli)
+        destination = os.path.join(target, *built.split('/'))
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        with open(destination, 'wb') as output:
+            output.write(content)
+        for encoding, suffix in ENCODINGS:
+            if encoding in variants:
+                with open(destination + suffix, 'wb') as output:
+                    output.write(variants[encoding])
+        assets[path] = built
+        sizes[path] = dict({'identity': len(content)}, **{encoding: len(data) for encoding, data in variants.items()})
+
+    os.makedirs(target, exist_ok=True)
+    manifest_path = os.path.join(target, 'manifest.json')
+    with open(manifest_path + '.tmp', 'w') as manifest:
+        json.dump({'assets': assets}, manifest, indent=1, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return sizes
+
+
+class AssetManifest(object):
+    """The built assets' manifest: logical path -> fingerprinted path. Empty
+    until `flask build-assets` has run, so a development checkout keeps using
+    the plain /static files."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.assets = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(os.path.join(self.folder, 'manifest.json')) as manifest:
+                data = json.load(manifest)
+        except (OSError, ValueError):
+            data = {}
+        self.assets = data.get('assets', {})
+
+    def built(self, path):
+        return self.assets.get(path)
+
+    def exists(self, built):
+        """Whether built is a fingerprinted file of this or an earlier build,
+        pages rendered before a rebuild still link the earlier ones."""
+        if not FINGERPRINT.search(built):
+            return False
+        path = safe_join(self.folder, built)
+        return path is not None and os.path.isfile(path)
+
+    def variant(self, built, accept_encoding):
+        """(file name, content encoding) of the best variant the client accepts,
+        looked up on disk as earlier builds are not in the manifest."""
+        for encoding, suffix in ENCODINGS:
+            if accept_encoding[encoding] and os.path.isfile(safe_join(self.folder, built + suffix)):
+                return built + suffix, encoding
+        return built, None
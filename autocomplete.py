@@ -0,0 +1,112 @@
+import sys
+import bisect
+import threading
+import unicodedata
+
+
+def normalize(text):
+    """Case folded, accents stripped, whitespace collapsed."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.casefold().split())
+
+
+def suffixes(name):
+    # "The Musical Hop" is entered as "the musical hop", "musical hop" and
+    # "hop", so a prefix of any word in the name finds it
+    words = normalize(name).split()
+    return [' '.join(words[start:]) for start in range(len(words))]
+
+
+class PrefixIndex(object):
+    """Name autocomplete over a sorted array, searched with bisect.
+
+    Entries are (normalized suffix, (kind, id)) kept in two parallel sorted
+    lists. A lookup bisects to the first key >= the prefix and walks forward
+    while keys still start with it, so it costs O(log n + matches) and never
+    touches the database. add() / remove() keep the lists sorted in place.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._refs = []
+        self._names = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def load(self, items):
+        """Replaces the whole index with (kind, id, name) items."""
+        names, entries = {}, []
+        for kind, id, name in items:
+            ref = (kind, id)
+            names[ref] = name
+            entries.extend((key, ref) for key in suffixes(name))
+        entries.sort()
+        keys = [key for key, ref in entries]
+        refs = [ref for key, ref in entries]
+        with self._lock:
+            self._keys, self._refs, self._names = keys, refs, names
+
+    def add(self, kind, id, name):
+        """Adds a name, or replaces the name stored for (kind, id)."""
+        ref = (kind, id)
+        with self._lock:
+            self._remove(ref)
+            self._names[ref] = name
+            for key in suffixes(name):
+                position = bisect.bisect_right(self._keys, key)
+                self._keys.insert(position, key)
+                self._refs.insert(position, ref)
+
+    def remove(self, kind, id):
+        with self._lock:
+            self._remove((kind, id))
+
+    def _remove(self, ref):
+        name = self._names.pop(ref, None)
+        if name is None:
+            return
+        for key in suffixes(name):
+            position = bisect.bisect_left(self._keys, key)
+            while position < len(self._keys) and self._keys[position] == key:
+                if self._refs[position] == ref:
+                    del self._keys[position]
+                    del self._refs[position]
+                    break
+                position += 1
+
+    def search(self, prefix, kinds=None, limit=10):
+        """Up to limit {type, id, name} matches, in key order."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        results, seen = [], set()
+        with self._lock:
+            position = bisect.bisect_left(self._keys, prefix)
+            while position < len(self._keys) and len(results) < limit:
+                if not self._keys[position].startswith(prefix):
+                    break
+                ref = self._refs[position]
+                if ref not in seen and (kinds is None or ref[0] in kinds):
+                    seen.add(ref)
+                    results.append({'type': ref[0], 'id': ref[1], 'name': self._names[ref]})
+                position += 1
+        return results
+
+    def memory(self):
+        """Approximate resident size in bytes of the lists, keys and names."""
+        with self._lock:
+            keys, names = list(self._keys), dict(self._names)
+        size = sys.getsizeof(keys) * 2 + sys.getsizeof(names)
+        size += sum(sys.getsizeof(key) for key in keys)
+        for (kind, id), name in names.items():
+            # one ref tuple per name, shared by all of its entries
+            size += sys.getsizeof((kind, id)) + sys.getsizeof(id) + sys.getsizeof(name)
+        return {
+            'names': len(names),
+            'entries': len(keys),
+            'bytes': size,
+            'bytes_per_100k_names': int(size * 100000 / len(names)) if names else 0,
+        }
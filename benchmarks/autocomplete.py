@@ -0,0 +1,90 @@
+"""Lookup latency and memory of the autocomplete prefix index.
+
+    python benchmarks/autocomplete.py [--names 100000] [--lookups 20000]
+
+Builds a PrefixIndex over synthetic venue / artist names shaped like the
+ones benchmarks/seed.py generates and reports build time, per-keystroke
+lookup latency, add / remove cost and resident memory (tracemalloc, plus
+the index's own estimate). Needs no database.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from autocomplete import PrefixIndex
+
+words = ('Blue', 'Velvet', 'Electric', 'Silver', 'Midnight', 'Golden', 'Wild', 'Lazy',
+         'Crimson', 'Echo', 'Neon', 'Paper', 'Iron', 'Lucky', 'Hollow', 'Northern')
+nouns = ('Hall', 'Room', 'Lounge', 'Club', 'Band', 'Trio', 'Collective', 'Orchestra')
+
+
+def names(count, rng):
+    for index in range(count):
+        kind = 'venue' if index % 3 == 0 else 'artist'
+        yield kind, index, '%s %s %s %d' % (rng.choice(words), rng.choice(words), rng.choice(nouns), index)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--names', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    items = list(names(args.names, rng))
+
+    index = PrefixIndex()
+    started = time.perf_counter()
+    index.load(items)
+    build_s = time.perf_counter() - started
+
+    # tracing slows the build down, so memory comes from a second, traced one
+    traced_index = PrefixIndex()
+    tracemalloc.start()
+    traced_index.load(items)
+    traced = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del traced_index
+
+    # keystrokes: 1 to 6 leading characters of a word of a random name
+    prefixes = []
+    for _ in range(args.lookups):
+        word = rng.choice(rng.choice(items)[2].split())
+        prefixes.append(word[:rng.randint(1, 6)])
+    latencies = []
+    for prefix in prefixes:
+        started = time.perf_counter()
+        index.search(prefix)
+        latencies.append((time.perf_counter() - started) * 1e6)
+
+    started = time.perf_counter()
+    for id in range(args.names, args.names + 1000):
+        index.add('artist', id, 'Velvet Echo Machine %d' % id)
+    add_us = (time.perf_counter() - started) * 1e6 / 1000
+    started = time.perf_counter()
+    for id in range(args.names, args.names + 1000):
+        index.remove('artist', id)
+    remove_us = (time.perf_counter() - started) * 1e6 / 1000
+
+    estimate = index.memory()
+    print('names            %d (%d entries)' % (estimate['names'], estimate['entries']))
+    print('build            %.2f s' % build_s)
+    print('lookup           p50 %.1f us, p99 %.1f us, max %.1f us' % (
+        percentile(latencies, 50), percentile(latencies, 99), max(latencies)))
+    print('add / remove     %.1f us / %.1f us' % (add_us, remove_us))
+    print('memory traced    %.1f MiB (%.1f MiB per 100k names)' % (
+        traced / 2.0 ** 20, traced * 100000.0 / args.names / 2.0 ** 20))
+    print('memory estimate  %.1f MiB per 100k names' % (estimate['bytes_per_100k_names'] / 2.0 ** 20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Latency of "who is free then" queries over large availability calendars.
+
+    python benchmarks/availability.py --shows 100k [--windows 50] [--weekly 2]
+                                      [--queries 200] [--explain]
+                                      [--database-url URL]
+
+Seeds shows with benchmarks/seed.py, then gives every venue and artist
+--windows one-off availability windows over the seeded three years and
+--weekly weekly ones, and times available() (the /api/v1/<kind>/available
+query) for random evenings of the upcoming year, with no filter, a city,
+a city and a genre and a genre alone. --explain prints the plan of one
+query per case. Uses a throwaway cluster like benchmarks/routes.py unless
+--database-url is given.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from routes import local_postgres, percentile  # noqa: E402
+
+BATCH = 10000
+
+
+def seed_calendars(db, Availability, owners, args, now):
+    """Inserts the windows of (owner column, id) pairs, returns the row count."""
+    rng = random.Random(args.seed)
+    table = Availability.__table__
+    one_off = table.insert().values(period=db.func.tsrange(db.bindparam('starts'), db.bindparam('ends')))
+    weekly = table.insert().values(period=db.func.tsrange(db.bindparam('starts'), None),
+                                   week_minutes=db.func.int4range(db.bindparam('lower'), db.bindparam('upper')))
+    first_day = (now - timedelta(days=2 * 365)).replace(hour=0, minute=0, second=0, microsecond=0)
+    one_off_rows, weekly_rows, count = [], [], 0
+
+    def flush(force=False):
+        nonlocal count
+        for statement, rows in ((one_off, one_off_rows), (weekly, weekly_rows)):
+            if rows and (force or len(rows) >= BATCH):
+                db.session.execute(statement, rows)
+                db.session.commit()
+                count += len(rows)
+                del rows[:]
+
+    for column, id in owners:
+        for _ in range(args.windows):
+            starts = first_day + timedelta(days=rng.randrange(3 * 365), hours=rng.randint(10, 20))
+            one_off_rows.append({'artist_id': None, 'venue_id': None, column: id,
+                                 'starts': starts, 'ends': starts + timedelta(hours=rng.randint(2, 8))})
+        for _ in range(args.weekly):
+            lower = rng.randrange(7) * 24 * 60 + rng.randint(18, 20) * 60
+            weekly_rows.append({'artist_id': None, 'venue_id': None, column: id, 'starts': first_day,
+                                'lower': lower, 'upper': min(lower + rng.randint(3, 5) * 60, 7 * 24 * 60)})
+        flush()
+    flush(force=True)
+    db.session.execute(db.text('ANALYZE "Availability"'))
+    db.session.commit()
+    return count
+
+
+def run(database_url, args):
+    os.environ['DATABASE_URL'] = database_url
+    from app import app, db, Venue, Artist, Availability, available, available_query
+    from flask_migrate import upgrade
+    import seed
+
+    now = datetime.now().replace(second=0, microsecond=0)
+    rng = random.Random(args.seed)
+    with app.app_context():
+        if args.database_url is None:
+            upgrade(directory=os.path.join(ROOT, 'migrations'))
+            print('seeded', seed.seed(seed.parse_scale(args.shows), args.seed, now))
+            owners = [('venue_id', row.id) for row in db.session.query(Venue.id)]
+            owners += [('artist_id', row.id) for row in db.session.query(Artist.id)]
+            started = time.perf_counter()
+            print('windows', seed_calendars(db, Availability, owners, args, now),
+                  'in %.1fs' % (time.perf_counter() - started))
+
+        cases = (
+            ('any', {}),
+            ('city', {'city': True}),
+            ('city+genre', {'city': True, 'genres': True}),
+            ('genre', {'genres': True}),
+        )
+        print('%-8s %-11s %9s %9s %9s %7s' % ('kind', 'filter', 'p50 ms', 'p95 ms', 'p99 ms', 'rows'))
+        for model in (Artist, Venue):
+            for name, case in cases:
+                latencies, found = [], 0
+                for number in range(args.queries + 1):
+                    day = now + timedelta(days=rng.randrange(1, 365))
+                    start = day.replace(hour=rng.randint(18, 21), minute=0)
+                    filters = {
+                        'city': rng.choice(seed.cities) if case.get('city') else None,
+                        'genres': [rng.choice(seed.genres)] if case.get('genres') else (),
+                    }
+                    with app.test_request_context():
+                        if args.explain and number == 0:
+                            explain(db, available_query(model, start, start + timedelta(hours=3), **filters)
+                                    .order_by(model.name, model.id).limit(args.limit))
+                        began = time.perf_counter()
+                        data, next_cursor = available(model, start, start + timedelta(hours=3), limit=args.limit,
+                                                      **filters)
+                        elapsed = time.perf_counter() - began
+                    if number:
+                        # the first query of a case only warms the caches
+                        latencies.append(elapsed * 1000)
+                        found += len(data)
+                print('%-8s %-11s %9.2f %9.2f %9.2f %7.1f' % (
+                    model.__tablename__.lower(), name, percentile(latencies, 50), percentile(latencies, 95),
+                    percentile(latencies, 99), found / float(args.queries)))
+        db.session.remove()
+
+
+def explain(db, query):
+    compiled = query.statement.compile(db.engine)
+    plan = db.session.connection().exec_driver_sql('EXPLAIN (ANALYZE, BUFFERS) %s' % compiled, compiled.params)
+    print('\n'.join(row[0] for row in plan) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shows', default='100k', help='1k, 100k, 1m or a number')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--windows', type=int, default=50, help='one-off windows per venue / artist')
+    parser.add_argument('--weekly', type=int, default=2, help='weekly windows per venue / artist')
+    parser.add_argument('--queries', type=int, default=200, help='queries per case')
+    parser.add_argument('--limit', type=int, default=50, help='rows per query')
+    parser.add_argument('--explain', action='store_true', help='print one query plan per case')
+    parser.add_argument('--database-url', help='benchmark an existing, already seeded database')
+    args = parser.parse_args()
+    if args.database_url:
+        run(args.database_url, args)
+    else:
+        with local_postgres() as url:
+            run(url, args)
+
+
+if __name__ == '__main__':
+    main()
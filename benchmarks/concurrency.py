@@ -0,0 +1,197 @@
+"""Concurrent request throughput, sync vs async serving mode.
+
+    python benchmarks/concurrency.py --shows 100k [--concurrency 1,16,64,256]
+                                     [--duration 10] [--threads 15]
+                                     [--database-url URL] [--output FILE]
+
+`uvicorn asgi:application` is started twice against the same seeded
+database: once with ASYNC_ENDPOINTS emptied, so every request runs on the
+SYNC_WORKER_THREADS pool with psycopg2 like the threaded `app.run()` server,
+and once with the default ASYNC_ENDPOINTS on asyncpg. At every concurrency
+level that many keep-alive clients cycle through the read-only routes for
+--duration seconds; requests per second and latency percentiles are printed
+and written as JSON, by default to
+benchmarks/results/concurrency-<commit>-<scale>.json.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from routes import local_postgres, free_port, percentile  # noqa: E402
+
+MODES = {
+    'sync': {'ASYNC_ENDPOINTS': ''},
+    'async': {},
+}
+
+
+def prepare(database_url, args):
+    os.environ['DATABASE_URL'] = database_url
+    from app import app, db, Venue, Artist
+    from flask_migrate import upgrade
+    import seed
+
+    with app.app_context():
+        if args.database_url is None:
+            upgrade(directory=os.path.join(ROOT, 'migrations'))
+            print('seeded', seed.seed(seed.parse_scale(args.shows), args.seed))
+        venue_id = db.session.query(db.func.min(Venue.id)).scalar()
+        artist_id = db.session.query(db.func.min(Artist.id)).scalar()
+        db.session.remove()
+    return [
+        '/venues', '/artists', '/shows', '/venues/%d' % venue_id, '/artists/%d' % artist_id,
+        '/venues/search?search_term=hall', '/api/v1/shows',
+    ]
+
+
+def start_server(database_url, mode, port, args):
+    env = dict(os.environ, DATABASE_URL=database_url, SHOW_ROLLOVER_INTERVAL='0', SQL_INSTRUMENTATION='0',
+               SYNC_WORKER_THREADS=str(args.threads), **MODES[mode])
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'asgi:application', '--port', str(port), '--no-access-log',
+         '--log-level', 'warning'],
+        cwd=ROOT, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            asyncio.run(fetch_once(port, '/'))
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    sys.exit('%s server did not come up on port %d' % (mode, port))
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    headers = {}
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get(b'transfer-encoding') == b'chunked':
+        # streamed listings
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    else:
+        await reader.readexactly(int(headers.get(b'content-length', 0)))
+    return status
+
+
+def request_bytes(path):
+    return ('GET %s HTTP/1.1\r\nHost: localhost\r\nUser-Agent: fyyur-bench\r\n\r\n' % path).encode()
+
+
+async def fetch_once(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(request_bytes(path))
+    await writer.drain()
+    status = await read_response(reader)
+    writer.close()
+    return status
+
+
+async def client(port, paths, offset, stop_at, latencies, errors):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    i = offset
+    try:
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            writer.write(request_bytes(paths[i % len(paths)]))
+            await writer.drain()
+            status = await read_response(reader)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status >= 500:
+                errors.append(status)
+            i += 1
+    finally:
+        writer.close()
+
+
+async def load(port, paths, concurrency, duration):
+    latencies, errors = [], []
+    stop_at = time.monotonic() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*[client(port, paths, n, stop_at, latencies, errors) for n in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+    }
+
+
+def run(database_url, args):
+    paths = prepare(database_url, args)
+    results = {}
+    for mode in MODES:
+        port = free_port()
+        server = start_server(database_url, mode, port, args)
+        try:
+            asyncio.run(load(port, paths, 4, 1))  # warm pools and caches
+            for concurrency in args.concurrency:
+                result = asyncio.run(load(port, paths, concurrency, args.duration))
+                results.setdefault(str(concurrency), {})[mode] = result
+                print('%-6s c=%-4d %s' % (mode, concurrency, json.dumps(result)))
+        finally:
+            server.terminate()
+            server.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shows', default='1k', help='1k, 100k, 1m or a number')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--concurrency', default='1,16,64,256',
+                        type=lambda value: [int(n) for n in value.split(',')])
+    parser.add_argument('--duration', type=float, default=10, help='seconds per concurrency level')
+    parser.add_argument('--threads', type=int, default=15, help='SYNC_WORKER_THREADS for both modes')
+    parser.add_argument('--database-url', help='benchmark an existing, already seeded database')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                            capture_output=True, text=True).stdout.strip() or 'unknown'
+    if args.database_url:
+        results = run(args.database_url, args)
+    else:
+        with local_postgres() as url:
+            results = run(url, args)
+
+    print('\n%-12s %12s %12s %8s' % ('concurrency', 'sync rps', 'async rps', 'ratio'))
+    for concurrency, modes in results.items():
+        sync, async_ = modes['sync']['rps'], modes['async']['rps']
+        print('%-12s %12.1f %12.1f %7.2fx' % (concurrency, sync, async_, async_ / max(sync, 1e-9)))
+
+    report = {
+        'commit': commit,
+        'scale': args.shows,
+        'duration': args.duration,
+        'threads': args.threads,
+        'created': datetime.now().isoformat(),
+        'concurrency': results,
+    }
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results',
+                                         'concurrency-%s-%s.json' % (commit, args.shows))
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('wrote', output)
+
+
+if __name__ == '__main__':
+    main()
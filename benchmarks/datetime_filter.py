@@ -0,0 +1,36 @@
+"""Per-row cost of the `datetime` Jinja filter.
+
+Compares the old string round trip (str() in the view, dateutil + babel in
+the filter) with the native datetime path. Needs no database:
+
+    python benchmarks/datetime_filter.py
+"""
+import os
+import sys
+import timeit
+from datetime import datetime
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import format_datetime
+
+ROWS = 10000
+value = datetime(2035, 4, 1, 20, 0)
+
+
+def string_round_trip():
+    date = dateutil.parser.parse(str(value))
+    return babel.dates.format_datetime(date, "EEEE MMMM, d, y 'at' h:mma", locale='en')
+
+
+def native():
+    return format_datetime(value, 'full')
+
+
+if __name__ == '__main__':
+    assert string_round_trip() == native()
+    for name, func in (('string round trip', string_round_trip), ('native datetime', native)):
+        seconds = min(timeit.repeat(func, number=ROWS, repeat=5))
+        print('%-18s %8.2f us/row' % (name, seconds / ROWS * 1e6))
@@ -0,0 +1,102 @@
+"""Memory and construction time of listing rows: entities, dicts, records.
+
+    python benchmarks/projections.py --shows 100k [--rows 5000] [--repeat 5]
+                                     [--database-url URL]
+
+Loads the same artist / venue listing rows three ways: full ORM entities
+(what artists() used to load), selected columns turned into dicts (the
+row._asdict() listings) and projection records (projections.py). For each
+it reports the fastest load time over --repeat runs, the time to build the
+objects from already fetched rows and the memory they keep alive
+(tracemalloc). Uses a throwaway cluster like benchmarks/routes.py unless
+--database-url is given.
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from routes import local_postgres  # noqa: E402
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def retained(func):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = func()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size, result
+
+
+def run(database_url, args):
+    os.environ['DATABASE_URL'] = database_url
+    from app import app, db, Venue, Artist, artist_listing_projection, venue_listing_projection
+    from flask_migrate import upgrade
+    import seed
+
+    with app.app_context():
+        if args.database_url is None:
+            upgrade(directory=os.path.join(ROOT, 'migrations'))
+            print('seeded', seed.seed(seed.parse_scale(args.shows), args.seed))
+
+        cases = (
+            ('artists', Artist, (Artist.name, Artist.id), artist_listing_projection),
+            ('venues', Venue, (Venue.city, Venue.state, Venue.name, Venue.id), venue_listing_projection),
+        )
+        print('%-8s %-9s %10s %12s %12s' % ('listing', 'objects', 'load ms', 'build ms', 'retained KiB'))
+        for name, model, order, projection in cases:
+            def entities():
+                db.session.expunge_all()
+                return model.query.order_by(*order).limit(args.rows).all()
+
+            def rows():
+                return projection.query(db.session).order_by(*order).limit(args.rows).all()
+
+            fetched = rows()
+            builds = {
+                'entities': (entities, None),
+                'dicts': (lambda: [row._asdict() for row in rows()], lambda: [row._asdict() for row in fetched]),
+                'records': (lambda: list(projection.records(rows())), lambda: list(projection.records(fetched))),
+            }
+            for kind, (load, build) in builds.items():
+                load_s, _ = timed(load, args.repeat)
+                build_s = timed(build, args.repeat)[0] if build else None
+                size, objects = retained(load)
+                print('%-8s %-9s %10.2f %12s %12.1f' % (
+                    name, kind, load_s * 1000, '%.2f' % (build_s * 1000) if build else '-', size / 1024.0))
+                del objects
+                db.session.expunge_all()
+        db.session.remove()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shows', default='100k', help='1k, 100k, 1m or a number')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--rows', type=int, default=5000, help='rows per listing')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database-url', help='benchmark an existing, already seeded database')
+    args = parser.parse_args()
+    if args.database_url:
+        run(args.database_url, args)
+    else:
+        with local_postgres() as url:
+            run(url, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""Route benchmarks against a throwaway local PostgreSQL.
+
+    python benchmarks/routes.py --shows 100k [--requests 50] [--output FILE]
+                                [--compare OLD.json] [--database-url URL]
+
+Unless --database-url is given, a cluster is created with initdb in a
+temporary directory, started with pg_ctl on a unix socket, migrated,
+seeded with benchmarks/seed.py and removed again. Every GET route of
+app.py (plus the two search POSTs) is driven through the Flask test client
+and latency percentiles, query counts and peak Python memory are written
+as JSON, by default to benchmarks/results/<commit>-<scale>.json.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def pg_binary(name):
+    path = shutil.which(name, path=os.environ.get('PG_BIN', '') + os.pathsep + os.environ.get('PATH', ''))
+    if path is None:
+        sys.exit('%s not found, put the PostgreSQL binaries on PATH or set PG_BIN' % name)
+    return path
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def local_postgres():
+    """Yields a database url for a private cluster that is removed afterwards."""
+    workdir = tempfile.mkdtemp(prefix='fyyur-bench-')
+    data, port = os.path.join(workdir, 'data'), free_port()
+    subprocess.run([pg_binary('initdb'), '-D', data, '-U', 'postgres', '-A', 'trust'],
+                   check=True, stdout=subprocess.DEVNULL)
+    options = "-p %d -k %s -c listen_addresses='' -c fsync=off" % (port, workdir)
+    subprocess.run([pg_binary('pg_ctl'), '-D', data, '-o', options, '-w', '-l',
+                    os.path.join(workdir, 'postgres.log'), 'start'], check=True, stdout=subprocess.DEVNULL)
+    try:
+        subprocess.run([pg_binary('createdb'), '-h', workdir, '-p', str(port), '-U', 'postgres', 'fyyur_bench'],
+                       check=True)
+        yield 'postgresql://postgres@/fyyur_bench?host=%s&port=%d' % (workdir, port)
+    finally:
+        subprocess.run([pg_binary('pg_ctl'), '-D', data, '-m', 'fast', 'stop'], stdout=subprocess.DEVNULL)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def query_strings(now):
+    """Query strings of the routes that only answer a 400 (or nothing) without one."""
+    evening = {'date': (now + timedelta(days=1)).strftime('%Y-%m-%d'), 'from': '19:00', 'to': '23:00'}
+    return {
+        'api.api_available_venues': evening,
+        'api.api_available_artists': evening,
+        'autocomplete': {'q': 'blue'},
+    }
+
+
+def routes(app, sample, now=None):
+    """(method, path, form) for every GET route, plus the search POSTs.
+
+    Rule arguments are filled from sample, rules with an argument it has no
+    value for are left out.
+    """
+    adapter = app.url_map.bind('localhost')
+    queries = query_strings(now or datetime.now())
+    found = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if rule.endpoint == 'static' or 'GET' not in rule.methods:
+            continue
+        missing = [name for name in rule.arguments if sample.get(name) is None]
+        if missing:
+            print('skipped %s, no sample %s' % (rule.rule, ', '.join(missing)))
+            continue
+        values = dict(queries.get(rule.endpoint, {}), **{name: sample[name] for name in rule.arguments})
+        found.append(('GET', adapter.build(rule.endpoint, values, method='GET'), None))
+    found.append(('POST', '/venues/search', {'search_term': 'hall'}))
+    found.append(('POST', '/artists/search', {'search_term': 'band'}))
+    return found
+
+
+def measure(db, client, method, path, form, requests):
+    queries = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    def call():
+        return client.open(path, method=method, data=form)
+
+    call()
+    latencies, counts = [], []
+    db.event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        for _ in range(requests):
+            del queries[:]
+            started = time.perf_counter()
+            response = call()
+            latencies.append((time.perf_counter() - started) * 1000)
+            counts.append(len(queries))
+    finally:
+        db.event.remove(db.engine, 'before_cursor_execute', count)
+
+    tracemalloc.start()
+    call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'status': response.status_code,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p90_ms': round(percentile(latencies, 90), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'queries': max(counts),
+        'peak_kib': round(peak / 1024.0, 1),
+    }
+
+
+def compare(old, new):
+    print('\n%-40s %12s %12s %8s' % ('route', 'old p50 ms', 'new p50 ms', 'change'))
+    for route, result in new['routes'].items():
+        before = old['routes'].get(route)
+        if before:
+            change = (result['p50_ms'] - before['p50_ms']) / max(before['p50_ms'], 1e-9) * 100
+            print('%-40s %12.3f %12.3f %+7.1f%%' % (route, before['p50_ms'], result['p50_ms'], change))
+
+
+def run(database_url, args):
+    os.environ['DATABASE_URL'] = database_url
+    from app import app, db, Venue, Artist, asset_manifest
+    from flask_migrate import upgrade
+    import seed
+
+    with app.app_context():
+        if args.database_url is None:
+            upgrade(directory=os.path.join(ROOT, 'migrations'))
+            print('seeded', seed.seed(seed.parse_scale(args.shows), args.seed))
+        sample = {
+            'venue_id': db.session.query(db.func.min(Venue.id)).scalar(),
+            'artist_id': db.session.query(db.func.min(Artist.id)).scalar(),
+            # a built stylesheet, once `flask build-assets` has run
+            'filename': asset_manifest.built('css/main.css') or next(iter(asset_manifest.assets.values()), None),
+        }
+        db.session.remove()
+
+        client = app.test_client()
+        results = {}
+        for method, path, form in routes(app, sample):
+            # the query string holds the date of the availability routes
+            key = '%s %s' % (method, path.split('?')[0])
+            results[key] = measure(db, client, method, path, form, args.requests)
+            print('%-40s %s' % (key, json.dumps(results[key])))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shows', default='1k', help='1k, 100k, 1m or a number')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--requests', type=int, default=50, help='timed requests per route')
+    parser.add_argument('--database-url', help='benchmark an existing, already seeded database')
+    parser.add_argument('--output')
+    parser.add_argument('--compare', help='earlier results file to diff against')
+    args = parser.parse_args()
+
+    commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                            capture_output=True, text=True).stdout.strip() or 'unknown'
+    if args.database_url:
+        results = run(args.database_url, args)
+    else:
+        with local_postgres() as url:
+            results = run(url, args)
+
+    report = {
+        'commit': commit,
+        'scale': args.shows,
+        'requests': args.requests,
+        'created': datetime.now().isoformat(),
+        'routes': results,
+    }
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results', '%s-%s.json' % (commit, args.shows))
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('wrote', output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
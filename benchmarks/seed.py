@@ -0,0 +1,113 @@
+"""Deterministic synthetic data for the Venue, Artist and Show tables.
+
+    python benchmarks/seed.py --shows 100k [--seed 7]
+
+Venue and artist counts scale with the number of shows (one venue per 20
+shows, one artist per 10), so every scale keeps the same shape.
+"""
+import os
+import sys
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import app, db, Venue, Artist, Show
+from forms import state_choices, genre_choices
+
+SCALES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+BATCH = 10000
+
+words = ('Blue', 'Velvet', 'Electric', 'Silver', 'Midnight', 'Golden', 'Wild', 'Lazy',
+         'Crimson', 'Echo', 'Neon', 'Paper', 'Iron', 'Lucky', 'Hollow', 'Northern')
+venue_nouns = ('Hall', 'Room', 'Lounge', 'Club', 'Theatre', 'Garden', 'Cellar', 'Bar')
+artist_nouns = ('Band', 'Trio', 'Collective', 'Orchestra', 'Kids', 'Sisters', 'Machine', 'Choir')
+cities = ('San Francisco', 'New York', 'Austin', 'Chicago', 'Seattle', 'Nashville',
+          'Denver', 'Portland', 'Boston', 'Atlanta', 'Detroit', 'Miami')
+states = [value for value, label in state_choices]
+genres = [value for value, label in genre_choices]
+
+
+def parse_scale(value):
+    return SCALES.get(value.lower()) or int(value)
+
+
+def entity(rng, index, nouns):
+    return {
+        'name': '%s %s %s %d' % (rng.choice(words), rng.choice(words), rng.choice(nouns), index),
+        'city': rng.choice(cities),
+        'state': rng.choice(states),
+        'phone': '%03d-%03d-%04d' % (rng.randrange(1000), rng.randrange(1000), rng.randrange(10000)),
+        'genres': rng.sample(genres, rng.randint(1, 3)),
+        'image_link': 'https://example.com/%s/%d.jpg' % (nouns[0].lower(), index),
+        'facebook_link': None,
+        'website_link': None,
+        'seeking_description': None,
+    }
+
+
+def insert(table, rows):
+    for start in range(0, len(rows), BATCH):
+        db.session.execute(table.insert(), rows[start:start + BATCH])
+        db.session.commit()
+
+
+def seed(shows, seed=7, now=None):
+    """Fills the (empty) tables and returns the row counts."""
+    rng = random.Random(seed)
+    now = now or datetime.now()
+    venue_count = max(1, shows // 20)
+    artist_count = max(1, shows // 10)
+
+    venues = []
+    for index in range(venue_count):
+        venue = entity(rng, index, venue_nouns)
+        venue.update(address='%d Main St' % rng.randrange(1, 9999), seeking_talent=rng.random() < 0.3)
+        venues.append(venue)
+    insert(Venue.__table__, venues)
+
+    artists = []
+    for index in range(artist_count):
+        artist = entity(rng, index, artist_nouns)
+        artist.update(looking_for_venues=rng.random() < 0.3)
+        artists.append(artist)
+    insert(Artist.__table__, artists)
+
+    venue_ids = [row.id for row in db.session.query(Venue.id)]
+    artist_ids = [row.id for row in db.session.query(Artist.id)]
+    # two years of history and one year of upcoming shows, two hours long
+    # and placed in three hour slots no venue or artist is booked twice in
+    slot = timedelta(hours=3)
+    slots = int(timedelta(days=3 * 365) / slot)
+    start = (now - timedelta(days=2 * 365)).replace(minute=0, second=0, microsecond=0)
+    booked = set()
+
+    def show():
+        while True:
+            venue_id, artist_id, index = rng.choice(venue_ids), rng.choice(artist_ids), rng.randrange(slots)
+            if ('venue', venue_id, index) not in booked and ('artist', artist_id, index) not in booked:
+                break
+        booked.update((('venue', venue_id, index), ('artist', artist_id, index)))
+        start_time = start + index * slot + timedelta(minutes=rng.randrange(60))
+        return {'venue_id': venue_id, 'artist_id': artist_id,
+                'start_time': start_time, 'end_time': start_time + timedelta(hours=2)}
+
+    for offset in range(0, shows, BATCH):
+        insert(Show.__table__, [show() for _ in range(min(BATCH, shows - offset))])
+
+    # the bulk inserts bypass the app's writes, so nothing has asked for a
+    # refresh and the view still holds the empty tables of the migration
+    db.session.execute(db.text('REFRESH MATERIALIZED VIEW show_listing'))
+    db.session.commit()
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+    return {'venues': venue_count, 'artists': artist_count, 'shows': shows}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shows', default='1k', help='1k, 100k, 1m or a number')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    with app.app_context():
+        print(seed(parse_scale(args.shows), args.seed))
@@ -0,0 +1,83 @@
+import time
+import threading
+from collections import OrderedDict
+from importlib import import_module
+
+
+class MemoryCache(object):
+    """Size bounded LRU cache, local to the worker process."""
+
+    def __init__(self, max_entries=1024, default_ttl=None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.default_ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache(object):
+    """Cache shared by every worker, needs the redis package."""
+
+    def __init__(self, url, prefix='fyyur:', default_ttl=None):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.default_ttl
+        self.client.set(self.prefix + key, value, ex=int(ttl) if ttl else None)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+def create_cache(config):
+    # PAGE_CACHE_BACKEND is 'memory', 'redis' or a 'module:Class' path to any
+    # class taking the app config with the same get / set / delete / clear methods
+    backend = config.get('PAGE_CACHE_BACKEND', 'memory')
+    ttl = config.get('PAGE_CACHE_TTL')
+    if backend == 'memory':
+        return MemoryCache(config.get('PAGE_CACHE_MAX_ENTRIES', 1024), ttl)
+    if backend == 'redis':
+        return RedisCache(config['PAGE_CACHE_URL'], default_ttl=ttl)
+    module, name = backend.split(':')
+    return getattr(import_module(module), name)(config)
@@ -0,0 +1,64 @@
+import os
+import json
+import hashlib
+import functools
+
+from flask import Response, make_response, request, session
+
+
+def template_digest(folder):
+    """Digest of every template, part of each ETag so a deploy that changes
+    the markup does not keep answering 304 for the old pages."""
+    digest = hashlib.sha1()
+    for root, dirs, files in sorted(os.walk(folder)):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, folder).encode('utf-8'))
+            with open(path, 'rb') as template:
+                digest.update(template.read())
+    return digest.hexdigest()
+
+
+def conditional(validator, salt='', modified_since=True):
+    """Answers GET requests with 304 while validator() says nothing changed.
+
+    validator takes the view's arguments and returns (last_modified, state)
+    from a query far cheaper than the view, or None to leave the request to
+    the view (a 404, say). The ETag covers state, the full path (pages,
+    cursors and filters live in the query string) and salt; Last-Modified is
+    last_modified. A request with a flashed message pending always renders.
+
+    Pass modified_since=False when removing a row can leave last_modified
+    where it was (a max over a table, say): If-Modified-Since alone then
+    never answers 304, only the ETag does.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+            validated = validator(*args, **kwargs)
+            if validated is None:
+                return view(*args, **kwargs)
+            last_modified, state = validated
+            raw = json.dumps([request.full_path, state, salt], default=str)
+            etag = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+            if request.if_none_match:
+                unchanged = request.if_none_match.contains(etag)
+            elif not modified_since:
+                unchanged = False
+            else:
+                # second resolution, like the header
+                unchanged = bool(request.if_modified_since and last_modified and
+                                 last_modified.replace(microsecond=0) <= request.if_modified_since)
+            response = Response(status=304) if unchanged else make_response(view(*args, **kwargs))
+            if response.status_code in (200, 304):
+                response.set_etag(etag)
+                response.last_modified = last_modified
+                # caches may keep the page but have to revalidate it
+                response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
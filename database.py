@@ -0,0 +1,83 @@
+import threading
+
+from flask import request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+
+def statement_timeout(config):
+    """Timeout in ms for a transaction started now, None for no timeout.
+
+    Only requests are bounded: migrations, CLI commands and the background
+    refreshes run on the same engine and may legitimately take minutes.
+    """
+    if not has_request_context():
+        return None
+    timeout = config.get('STATEMENT_TIMEOUTS', {}).get(request.endpoint)
+    if timeout is None:
+        timeout = config.get('DB_STATEMENT_TIMEOUT')
+    return timeout or None
+
+
+def init_statement_timeouts(app):
+    def begin(conn):
+        if conn.dialect.name != 'postgresql':
+            return
+        timeout = statement_timeout(app.config)
+        if timeout is not None:
+            conn.exec_driver_sql('SET LOCAL statement_timeout = %d' % int(timeout))
+
+    event.listen(Engine, 'begin', begin)
+
+
+def constraint_name(error):
+    """Name of the constraint an IntegrityError violated, None if unknown."""
+    orig = getattr(error, 'orig', error)
+    # psycopg2 carries the server's diagnostics, asyncpg errors come wrapped
+    # in the DBAPI adapter's exception
+    diag = getattr(orig, 'diag', None)
+    if diag is not None:
+        return diag.constraint_name
+    return getattr(getattr(orig, '__cause__', None), 'constraint_name', None)
+
+
+class WaitCountingQueuePool(QueuePool):
+    """QueuePool that counts the callers inside a checkout.
+
+    A caller counts from asking for a connection until it has one, so with
+    a free connection it is gone again at once, while the pool is exhausted
+    it is waiting for up to pool_timeout seconds.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(WaitCountingQueuePool, self).__init__(*args, **kwargs)
+        self._waiting = 0
+        self._waiting_lock = threading.Lock()
+
+    def _do_get(self):
+        with self._waiting_lock:
+            self._waiting += 1
+        try:
+            return super(WaitCountingQueuePool, self)._do_get()
+        finally:
+            with self._waiting_lock:
+                self._waiting -= 1
+
+    def waiting(self):
+        return self._waiting
+
+
+def pool_stats(engine):
+    """Size, checked out, idle, overflow and waiting connections of an engine's pool.
+
+    Only the pool's public counters are read, so pool classes without them
+    just report fewer; waiting needs a WaitCountingQueuePool.
+    """
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow', 'waiting'):
+        counter = getattr(pool, name, None)
+        if callable(counter):
+            stats[name] = counter()
+    return stats
@@ -0,0 +1,140 @@
+import csv
+import json
+from datetime import timedelta
+from itertools import islice
+
+import dateutil.parser
+
+from forms import state_choices, genre_choices
+
+states = {value for value, label in state_choices}
+genres = {value for value, label in genre_choices}
+
+venue_fields = ('name', 'city', 'state', 'address', 'phone', 'genres', 'image_link',
+                'facebook_link', 'website_link', 'seeking_talent', 'seeking_description')
+artist_fields = ('name', 'city', 'state', 'phone', 'genres', 'image_link', 'facebook_link',
+                 'website_link', 'looking_for_venues', 'seeking_description')
+
+
+def read_rows(stream, format):
+    """Yields (line number, row, error) without loading the whole file."""
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, 'invalid json: %s' % e
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, 'expected a json object'
+            continue
+        yield line_number, row, None
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def boolean(value):
+    if isinstance(value, bool):
+        return value
+    return (text(value) or '').lower() in ('1', 'true', 'yes', 'y')
+
+
+def genre_list(value):
+    # CSV cells hold comma separated genres, JSONL rows may use a list
+    if isinstance(value, list):
+        return [text(genre) for genre in value if text(genre)]
+    return [genre.strip() for genre in (text(value) or '').split(',') if genre.strip()]
+
+
+def local_time(value):
+    # times are stored without a zone, in the server's local time that
+    # datetime.now() compares them with, so an explicit offset is converted
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def clean_entity(row, fields, required):
+    values = {field: text(row.get(field)) for field in fields}
+    values['genres'] = genre_list(row.get('genres'))
+    for flag in ('seeking_talent', 'looking_for_venues'):
+        if flag in values:
+            values[flag] = boolean(row.get(flag))
+
+    errors = ['missing %s' % field for field in required if not values[field]]
+    if values['state'] and values['state'] not in states:
+        errors.append('unknown state %s' % values['state'])
+    unknown = [genre for genre in values['genres'] if genre not in genres]
+    if unknown:
+        errors.append('unknown genres %s' % ', '.join(unknown))
+    return values, errors
+
+
+def clean_venue(row):
+    return clean_entity(row, venue_fields, ('name', 'city', 'state', 'address', 'phone', 'genres'))
+
+
+def clean_artist(row):
+    return clean_entity(row, artist_fields, ('name', 'city', 'state', 'phone', 'genres'))
+
+
+def clean_show(row, default_duration=120):
+    # a show names its artist and venue either by id or by exact name,
+    # references are resolved per batch by the import command. It ends at
+    # end_time, after duration minutes or after default_duration minutes.
+    # Times with an offset come back in local time, like every stored one.
+    values, errors = {}, []
+    for ref in ('artist', 'venue'):
+        ref_id, name = text(row.get(ref + '_id')), text(row.get(ref))
+        if ref_id:
+            try:
+                values[ref + '_id'] = int(ref_id)
+            except ValueError:
+                errors.append('invalid %s_id %s' % (ref, ref_id))
+        elif name:
+            values[ref] = name
+        else:
+            errors.append('missing %s_id or %s' % (ref, ref))
+    for field in ('start_time', 'end_time'):
+        value = text(row.get(field))
+        if not value:
+            continue
+        try:
+            values[field] = local_time(dateutil.parser.parse(value))
+        except (ValueError, OverflowError):
+            errors.append('invalid %s %s' % (field, value))
+    if 'start_time' not in values:
+        if not text(row.get('start_time')):
+            errors.append('missing start_time')
+        return values, errors
+    if 'end_time' not in values and not text(row.get('end_time')):
+        duration = text(row.get('duration'))
+        try:
+            minutes = int(duration) if duration else default_duration
+        except ValueError:
+            errors.append('invalid duration %s' % duration)
+        else:
+            values['end_time'] = values['start_time'] + timedelta(minutes=minutes)
+    if 'end_time' in values and values['end_time'] <= values['start_time']:
+        errors.append('end_time not after start_time')
+    return values, errors
@@ -0,0 +1,150 @@
+import time
+import threading
+
+import jinja2
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def add_render_time(started):
+    stats = g.get('sql_stats') if has_request_context() else None
+    if stats is not None:
+        stats['render_ms'] += (time.perf_counter() - started) * 1000
+
+
+class TimedTemplate(jinja2.Template):
+    """Adds the time spent rendering to the current request's stats, for
+    streamed templates the time spent producing each chunk."""
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super(TimedTemplate, self).render(*args, **kwargs)
+        finally:
+            add_render_time(started)
+
+    def generate(self, *args, **kwargs):
+        chunks = super(TimedTemplate, self).generate(*args, **kwargs)
+        while True:
+            started = time.perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                add_render_time(started)
+            yield chunk
+
+
+class SQLInstrumentation(object):
+    """Per-request query count, DB time and template time.
+
+    Statements arrive from SQLAlchemy already parametrised, so a statement
+    string executed SQL_N_PLUS_ONE_THRESHOLD times or more in one request is
+    flagged as a likely N+1. Every response gets a Server-Timing header and
+    the numbers are aggregated per endpoint for the debug page.
+
+    The header is sent before a streamed body, so for streamed pages it
+    leaves out the rendering and the queries that run while the body is
+    sent. Those are in the debug page, which records streamed responses
+    once they are closed.
+    """
+
+    def __init__(self, app=None):
+        self.endpoints = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.threshold = app.config.get('SQL_N_PLUS_ONE_THRESHOLD', 5)
+        app.jinja_env.template_class = TimedTemplate
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        g.sql_stats = {
+            'started': time.perf_counter(),
+            'queries': 0,
+            'db_ms': 0.0,
+            'render_ms': 0.0,
+            'statements': {},
+        }
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and g.get('sql_stats') is not None:
+            conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not has_request_context() or g.get('sql_stats') is None or not conn.info.get('query_started'):
+            return
+        stats = g.sql_stats
+        stats['queries'] += 1
+        stats['db_ms'] += (time.perf_counter() - conn.info['query_started'].pop()) * 1000
+        stats['statements'][statement] = stats['statements'].get(statement, 0) + 1
+
+    def _after_request(self, response):
+        stats = g.get('sql_stats')
+        if stats is None:
+            return response
+        endpoint = request.endpoint or request.path
+        total_ms = (time.perf_counter() - stats['started']) * 1000
+        response.headers.add('Server-Timing', 'db;dur=%.1f;desc="%d queries", tpl;dur=%.1f, total;dur=%.1f' % (
+            stats['db_ms'], stats['queries'], stats['render_ms'], total_ms))
+        if response.is_streamed:
+            # g.sql_stats keeps counting while the body renders
+            response.call_on_close(lambda: self._finish(endpoint, stats))
+        else:
+            g.pop('sql_stats')
+            self._finish(endpoint, stats)
+        return response
+
+    def _finish(self, endpoint, stats):
+        total_ms = (time.perf_counter() - stats['started']) * 1000
+        repeated = {statement: count for statement, count in stats['statements'].items()
+                    if count >= self.threshold}
+        for statement, count in repeated.items():
+            self.app.logger.warning('possible N+1 in %s: %d x %s', endpoint, count,
+                                    ' '.join(statement.split())[:200])
+        self._record(endpoint, stats, total_ms, repeated)
+
+    def _record(self, endpoint, stats, total_ms, repeated):
+        with self._lock:
+            entry = self.endpoints.setdefault(endpoint, {
+                'requests': 0, 'queries': 0, 'max_queries': 0,
+                'db_ms': 0.0, 'render_ms': 0.0, 'total_ms': 0.0, 'n_plus_one': {},
+            })
+            entry['requests'] += 1
+            entry['queries'] += stats['queries']
+            entry['max_queries'] = max(entry['max_queries'], stats['queries'])
+            entry['db_ms'] += stats['db_ms']
+            entry['render_ms'] += stats['render_ms']
+            entry['total_ms'] += total_ms
+            for statement, count in repeated.items():
+                entry['n_plus_one'][statement] = max(entry['n_plus_one'].get(statement, 0), count)
+
+    def summary(self):
+        """Per-endpoint averages, slowest endpoints first."""
+        with self._lock:
+            rows = []
+            for endpoint, entry in self.endpoints.items():
+                requests = entry['requests']
+                rows.append({
+                    'endpoint': endpoint,
+                    'requests': requests,
+                    'avg_queries': entry['queries'] / float(requests),
+                    'max_queries': entry['max_queries'],
+                    'avg_db_ms': entry['db_ms'] / requests,
+                    'avg_render_ms': entry['render_ms'] / requests,
+                    'avg_total_ms': entry['total_ms'] / requests,
+                    'n_plus_one': sorted(entry['n_plus_one'].items(), key=lambda item: -item[1]),
+                })
+        return sorted(rows, key=lambda row: -row['avg_total_ms'])
+
+    def reset(self):
+        with self._lock:
+            self.endpoints.clear()
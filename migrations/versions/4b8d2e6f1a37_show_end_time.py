@@ -0,0 +1,54 @@
+"""show end times and GiST exclusion constraints against double booking
+
+Revision ID: 4b8d2e6f1a37
+Revises: e81b5f3c6a27
+Create Date: 2026-10-18 14:02:37.518904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b8d2e6f1a37'
+down_revision = 'e81b5f3c6a27'
+branch_labels = None
+depends_on = None
+
+# existing shows run this long, or until the venue's or artist's next show
+BACKFILL_DURATION = '2 hours'
+
+
+def upgrade():
+    # btree_gist provides the GiST = operator class for the integer ids
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    # clamped to the next start at the same venue and of the same artist, so
+    # the constraints hold for the existing rows. Shows starting at the same
+    # minute at one venue / for one artist end up empty ([t, t) overlaps
+    # nothing) and are left for someone to sort out by hand.
+    op.execute("""
+    UPDATE "Show" AS s
+       SET end_time = LEAST(n.start_time + interval '{duration}',
+                            COALESCE(n.next_at_venue, 'infinity'),
+                            COALESCE(n.next_for_artist, 'infinity'))
+      FROM (SELECT id, start_time,
+                   lead(start_time) OVER (PARTITION BY venue_id ORDER BY start_time, id) AS next_at_venue,
+                   lead(start_time) OVER (PARTITION BY artist_id ORDER BY start_time, id) AS next_for_artist
+              FROM "Show") AS n
+     WHERE s.id = n.id""".format(duration=BACKFILL_DURATION))
+    op.alter_column('Show', 'end_time', nullable=False)
+    # NOT VALID: checked for new and updated rows, not the empty legacy ones
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_end_after_start" CHECK (end_time > start_time) NOT VALID')
+    for column in ('venue_id', 'artist_id'):
+        op.execute("""
+        ALTER TABLE "Show" ADD CONSTRAINT "Show_{name}_no_overlap"
+          EXCLUDE USING gist ({column} WITH =, tsrange(start_time, end_time) WITH &&)""".format(
+            name=column[:-3], column=column))
+
+
+def downgrade():
+    op.drop_constraint('Show_artist_no_overlap', 'Show')
+    op.drop_constraint('Show_venue_no_overlap', 'Show')
+    op.drop_constraint('Show_end_after_start', 'Show')
+    op.drop_column('Show', 'end_time')
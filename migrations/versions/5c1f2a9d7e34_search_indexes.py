@@ -0,0 +1,32 @@
+"""search indexes on Venue and Artist
+
+Revision ID: 5c1f2a9d7e34
+Revises: 28f49b343108
+Create Date: 2026-10-18 09:12:40.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1f2a9d7e34'
+down_revision = '28f49b343108'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('search_text', sa.Text(), sa.Computed("name || ' ' || city || ' ' || state"), nullable=True))
+        op.create_index('ix_{}_search_text_trgm'.format(table), table, ['search_text'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'})
+        op.create_index('ix_{}_genres'.format(table), table, ['genres'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_index('ix_{}_genres'.format(table), table_name=table)
+        op.drop_index('ix_{}_search_text_trgm'.format(table), table_name=table)
+        op.drop_column(table, 'search_text')
@@ -0,0 +1,48 @@
+"""Availability windows of artists and venues
+
+Revision ID: 7e3a9c5d2b14
+Revises: 4b8d2e6f1a37
+Create Date: 2026-10-18 15:21:09.336170
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '7e3a9c5d2b14'
+down_revision = '4b8d2e6f1a37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Availability',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=True),
+    sa.Column('venue_id', sa.Integer(), nullable=True),
+    sa.Column('period', postgresql.TSRANGE(), nullable=False),
+    sa.Column('week_minutes', postgresql.INT4RANGE(), nullable=True),
+    sa.CheckConstraint('num_nonnulls(artist_id, venue_id) = 1', name='Availability_one_owner'),
+    sa.CheckConstraint('week_minutes <@ int4range(0, 10080)', name='Availability_week_minutes'),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # (owner, period) needs btree_gist, added with the show exclusion constraints
+    op.create_index('ix_Availability_artist_id_period', 'Availability', ['artist_id', 'period'], unique=False,
+                    postgresql_using='gist', postgresql_where=sa.text('artist_id IS NOT NULL'))
+    op.create_index('ix_Availability_venue_id_period', 'Availability', ['venue_id', 'period'], unique=False,
+                    postgresql_using='gist', postgresql_where=sa.text('venue_id IS NOT NULL'))
+    op.create_index('ix_Availability_period', 'Availability', ['period'], unique=False, postgresql_using='gist')
+    # "free in city Y" filters artists the way the venue listing index does venues
+    op.create_index('ix_Artist_city_state_name', 'Artist', ['city', 'state', 'name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Artist_city_state_name', table_name='Artist')
+    op.drop_index('ix_Availability_period', table_name='Availability')
+    op.drop_index('ix_Availability_venue_id_period', table_name='Availability')
+    op.drop_index('ix_Availability_artist_id_period', table_name='Availability')
+    op.drop_table('Availability')
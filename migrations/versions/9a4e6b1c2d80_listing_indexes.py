@@ -0,0 +1,32 @@
+"""indexes for listing, detail and show history queries
+
+Revision ID: 9a4e6b1c2d80
+Revises: 5c1f2a9d7e34
+Create Date: 2026-10-18 10:02:17.530911
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4e6b1c2d80'
+down_revision = '5c1f2a9d7e34'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_start_time_desc', 'Show', [sa.text('start_time DESC'), sa.text('id DESC')], unique=False)
+    op.create_index('ix_Venue_city_state_name', 'Venue', ['city', 'state', 'name', 'id'], unique=False)
+    op.create_index('ix_Artist_name', 'Artist', ['name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Artist_name', table_name='Artist')
+    op.drop_index('ix_Venue_city_state_name', table_name='Venue')
+    op.drop_index('ix_Show_start_time_desc', table_name='Show')
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
@@ -0,0 +1,78 @@
+"""created_at / updated_at on Venue, Artist and Show for HTTP validators
+
+Revision ID: a5c8e2f4d963
+Revises: 7e3a9c5d2b14
+Create Date: 2026-10-18 16:47:52.104388
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a5c8e2f4d963'
+down_revision = '7e3a9c5d2b14'
+branch_labels = None
+depends_on = None
+
+TABLES = ('Venue', 'Artist', 'Show')
+
+SHOW_LISTING = """
+    CREATE MATERIALIZED VIEW show_listing AS
+    SELECT s.id, s.start_time, s.venue_id, v.name AS venue_name,
+           s.artist_id, a.name AS artist_name, a.image_link AS artist_image_link{updated_at}
+      FROM "Show" s
+      JOIN "Venue" v ON v.id = s.venue_id
+      JOIN "Artist" a ON a.id = s.artist_id
+    WITH DATA"""
+
+
+def create_show_listing(updated_at):
+    op.execute(SHOW_LISTING.format(
+        updated_at=',\n           GREATEST(s.updated_at, v.updated_at, a.updated_at) AS updated_at' if updated_at else ''))
+    op.create_index('ix_show_listing_id', 'show_listing', ['id'], unique=True)
+    op.create_index('ix_show_listing_start_time_desc', 'show_listing',
+                    [sa.text('start_time DESC'), sa.text('id DESC')], unique=False)
+    if updated_at:
+        op.create_index('ix_show_listing_updated_at', 'show_listing', ['updated_at'], unique=False)
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('clock_timestamp()'), nullable=False))
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('clock_timestamp()'), nullable=False))
+    # max(updated_at) behind the /venues and /artists validators
+    op.create_index('ix_Venue_updated_at', 'Venue', ['updated_at'], unique=False)
+    op.create_index('ix_Artist_updated_at', 'Artist', ['updated_at'], unique=False)
+
+    # the stored show counters are on the venue / artist pages and listings,
+    # so the counter triggers and the roll-over job count as modifications
+    op.execute("""
+    CREATE FUNCTION touch_updated_at() RETURNS trigger AS $$
+    BEGIN
+      NEW.updated_at := clock_timestamp();
+      RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""")
+    for table in ('Venue', 'Artist'):
+        op.execute("""
+        CREATE TRIGGER "{table}_counters_touch" BEFORE UPDATE OF upcoming_shows_count, past_shows_count ON "{table}"
+          FOR EACH ROW WHEN (OLD.upcoming_shows_count IS DISTINCT FROM NEW.upcoming_shows_count
+                             OR OLD.past_shows_count IS DISTINCT FROM NEW.past_shows_count)
+          EXECUTE FUNCTION touch_updated_at()""".format(table=table))
+
+    op.execute('DROP MATERIALIZED VIEW show_listing')
+    create_show_listing(updated_at=True)
+
+
+def downgrade():
+    op.execute('DROP MATERIALIZED VIEW show_listing')
+    create_show_listing(updated_at=False)
+    for table in ('Artist', 'Venue'):
+        op.execute('DROP TRIGGER "{table}_counters_touch" ON "{table}"'.format(table=table))
+    op.execute('DROP FUNCTION touch_updated_at()')
+    op.drop_index('ix_Artist_updated_at', table_name='Artist')
+    op.drop_index('ix_Venue_updated_at', table_name='Venue')
+    for table in reversed(TABLES):
+        op.drop_column(table, 'updated_at')
+        op.drop_column(table, 'created_at')
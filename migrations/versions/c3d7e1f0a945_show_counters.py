@@ -0,0 +1,98 @@
+"""stored upcoming / past show counters on Venue and Artist
+
+Revision ID: c3d7e1f0a945
+Revises: 9a4e6b1c2d80
+Create Date: 2026-10-18 11:40:03.671290
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d7e1f0a945'
+down_revision = '9a4e6b1c2d80'
+branch_labels = None
+depends_on = None
+
+# (table, Show column) pairs that carry counters
+COUNTED = (('Venue', 'venue_id'), ('Artist', 'artist_id'))
+
+
+def apply_counts(transition, sign):
+    # adds (sign '+') or removes (sign '-') the shows of a transition table,
+    # split at the last roll-over tick held in the local variable tick
+    return '\n'.join("""
+    UPDATE "{table}" AS t
+       SET upcoming_shows_count = t.upcoming_shows_count {sign} c.upcoming,
+           past_shows_count = t.past_shows_count {sign} c.past
+      FROM (SELECT {column} AS id,
+                   count(*) FILTER (WHERE start_time > tick) AS upcoming,
+                   count(*) FILTER (WHERE start_time <= tick) AS past
+              FROM {transition} GROUP BY {column}) AS c
+     WHERE t.id = c.id;""".format(table=table, column=column, sign=sign, transition=transition)
+        for table, column in COUNTED)
+
+
+def upgrade():
+    for table, column in COUNTED:
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+    op.create_table('ShowRollover',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rolled_over_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # the app's clock rather than the database's localtimestamp: the pages and
+    # rollover_shows() split upcoming from past shows at datetime.now()
+    op.execute(sa.text('INSERT INTO "ShowRollover" (id, rolled_over_at) VALUES (1, :now)')
+               .bindparams(now=datetime.now()))
+
+    for table, column in COUNTED:
+        op.execute("""
+        UPDATE "{table}" AS t
+           SET upcoming_shows_count = c.upcoming, past_shows_count = c.past
+          FROM (SELECT s.{column} AS id,
+                       count(*) FILTER (WHERE s.start_time > r.rolled_over_at) AS upcoming,
+                       count(*) FILTER (WHERE s.start_time <= r.rolled_over_at) AS past
+                  FROM "Show" s, "ShowRollover" r GROUP BY s.{column}) AS c
+         WHERE t.id = c.id""".format(table=table, column=column))
+
+    # statement level triggers see every row of a multi-row insert at once, so
+    # a bulk import costs one UPDATE per counted table instead of one per show.
+    # FOR SHARE on the tick serialises them with the roll-over job.
+    op.execute("""
+    CREATE FUNCTION show_counters() RETURNS trigger AS $$
+    DECLARE
+      tick timestamp;
+    BEGIN
+      SELECT rolled_over_at INTO tick FROM "ShowRollover" WHERE id = 1 FOR SHARE;
+      IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        {remove}
+      END IF;
+      IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        {add}
+      END IF;
+      RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""".format(remove=apply_counts('old_shows', '-'), add=apply_counts('new_shows', '+')))
+    op.execute('CREATE TRIGGER show_counters_insert AFTER INSERT ON "Show" '
+               'REFERENCING NEW TABLE AS new_shows FOR EACH STATEMENT EXECUTE FUNCTION show_counters()')
+    op.execute('CREATE TRIGGER show_counters_update AFTER UPDATE ON "Show" '
+               'REFERENCING OLD TABLE AS old_shows NEW TABLE AS new_shows FOR EACH STATEMENT EXECUTE FUNCTION show_counters()')
+    op.execute('CREATE TRIGGER show_counters_delete AFTER DELETE ON "Show" '
+               'REFERENCING OLD TABLE AS old_shows FOR EACH STATEMENT EXECUTE FUNCTION show_counters()')
+
+
+def downgrade():
+    op.execute('DROP TRIGGER show_counters_delete ON "Show"')
+    op.execute('DROP TRIGGER show_counters_update ON "Show"')
+    op.execute('DROP TRIGGER show_counters_insert ON "Show"')
+    op.execute('DROP FUNCTION show_counters()')
+    op.drop_table('ShowRollover')
+    for table, column in COUNTED:
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
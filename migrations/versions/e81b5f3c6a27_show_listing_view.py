@@ -0,0 +1,35 @@
+"""materialized show_listing view for /shows
+
+Revision ID: e81b5f3c6a27
+Revises: c3d7e1f0a945
+Create Date: 2026-10-18 12:55:48.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81b5f3c6a27'
+down_revision = 'c3d7e1f0a945'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+    CREATE MATERIALIZED VIEW show_listing AS
+    SELECT s.id, s.start_time, s.venue_id, v.name AS venue_name,
+           s.artist_id, a.name AS artist_name, a.image_link AS artist_image_link
+      FROM "Show" s
+      JOIN "Venue" v ON v.id = s.venue_id
+      JOIN "Artist" a ON a.id = s.artist_id
+    WITH DATA""")
+    # the unique index is what allows REFRESH ... CONCURRENTLY
+    op.create_index('ix_show_listing_id', 'show_listing', ['id'], unique=True)
+    op.create_index('ix_show_listing_start_time_desc', 'show_listing',
+                    [sa.text('start_time DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade():
+    op.execute('DROP MATERIALIZED VIEW show_listing')
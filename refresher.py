@@ -0,0 +1,101 @@
+import time
+import threading
+
+
+class DebouncedRefresher(object):
+    """Runs refresh() in a background thread once writes have settled.
+
+    request() marks the data dirty. The refresh runs `delay` seconds after
+    the last request, or `max_delay` seconds after the first unrefreshed one
+    under a steady stream of writes, so a burst of writes costs one refresh.
+    A failed refresh is retried after `delay` seconds, doubling with every
+    further failure up to `max_delay`.
+    """
+
+    def __init__(self, refresh, delay=2.0, max_delay=30.0, logger=None):
+        self.refresh = refresh
+        self.delay = delay
+        self.max_delay = max_delay
+        self.logger = logger
+        self.dirty_since = None
+        self.last_request = None
+        self.refreshed_at = None
+        self.last_duration = None
+        self.refreshes = 0
+        self.failures = 0
+        self._retry_at = None
+        self._retry_delay = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def request(self):
+        now = time.time()
+        with self._lock:
+            if self.dirty_since is None:
+                self.dirty_since = now
+            self.last_request = now
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='debounced-refresh', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _due(self):
+        with self._lock:
+            if self.dirty_since is None:
+                return None
+            due = min(self.last_request + self.delay, self.dirty_since + self.max_delay)
+            # new writes do not cut a backoff short
+            if self._retry_at is not None:
+                due = max(due, self._retry_at)
+            return due
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            due = self._due()
+            while due is not None and due > time.time():
+                self._wake.wait(due - time.time())
+                self._wake.clear()
+                due = self._due()
+            if due is not None:
+                self.run_now()
+
+    def run_now(self):
+        with self._lock:
+            requested = self.last_request
+        started = time.perf_counter()
+        try:
+            self.refresh()
+        except Exception:
+            with self._lock:
+                self.failures += 1
+                self._retry_delay = min(self._retry_delay * 2, self.max_delay) if self._retry_delay else self.delay
+                retry_delay = self._retry_delay
+                self._retry_at = time.time() + retry_delay
+            if self.logger is not None:
+                self.logger.exception('refresh failed, retrying in %.1fs', retry_delay)
+            # the data is still dirty, wake the thread to wait for the retry
+            self._wake.set()
+            return
+        with self._lock:
+            self._retry_at = self._retry_delay = None
+            self.last_duration = time.perf_counter() - started
+            self.refreshed_at = time.time()
+            self.refreshes += 1
+            # writes that arrived while refreshing still need another pass
+            if self.last_request == requested:
+                self.dirty_since = None
+            else:
+                self._wake.set()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'refreshes': self.refreshes,
+                'failures': self.failures,
+                'refreshed_at': self.refreshed_at,
+                'last_refresh_ms': round(self.last_duration * 1000, 1) if self.last_duration is not None else None,
+                'stale_seconds': round(time.time() - self.dirty_since, 1) if self.dirty_since is not None else 0,
+            }
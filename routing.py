@@ -0,0 +1,137 @@
+import time
+import threading
+
+from flask import g, request, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, event, orm
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from database import WaitCountingQueuePool
+
+# sizing arguments only pools with a queue of connections take
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_use_lifo')
+
+
+def engine_options(url, options):
+    """options for create_engine(url) without the queue sizing the pools
+    SQLite uses reject. SQLALCHEMY_ENGINE_OPTIONS is written for PostgreSQL."""
+    url = make_url(url)
+    options = dict(options or {})
+    pool_class = options.get('poolclass') or url.get_dialect().get_pool_class(url)
+    if pool_class is QueuePool:
+        # same pool, plus the waiting count of /_debug/pool
+        options['poolclass'] = pool_class = WaitCountingQueuePool
+    if not issubclass(pool_class, QueuePool):
+        for name in QUEUE_POOL_OPTIONS:
+            options.pop(name, None)
+    return options
+
+
+class ReplicaSet(object):
+    """Round-robin over the replica engines, skipping unhealthy ones.
+
+    A replica that fails to connect (or drops a connection) is left out for
+    REPLICA_RETRY_SECONDS and is probed with SELECT 1 before it is used
+    again. With no healthy replica reads fall back to the primary.
+    """
+
+    def __init__(self, urls, options=None, retry_seconds=30):
+        self.engines = [create_engine(url, **engine_options(url, options)) for url in urls]
+        self.retry_seconds = retry_seconds
+        # every replica is probed before its first use
+        self._down_until = dict.fromkeys(self.engines, 0)
+        self._next = 0
+        self._lock = threading.Lock()
+        for engine in self.engines:
+            event.listen(engine, 'handle_error', self._handle_error)
+
+    def _handle_error(self, context):
+        # dropped connections and failed connects (no connection yet)
+        if context.engine is not None and (context.is_disconnect or context.connection is None):
+            self.mark_down(context.engine)
+
+    def mark_down(self, engine):
+        self._down_until[engine] = time.monotonic() + self.retry_seconds
+
+    def probe(self, engine):
+        try:
+            with engine.connect() as conn:
+                conn.exec_driver_sql('SELECT 1')
+        except Exception:
+            self.mark_down(engine)
+            return False
+        self._down_until.pop(engine, None)
+        return True
+
+    def choose(self):
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % max(len(self.engines), 1)
+        now = time.monotonic()
+        for offset in range(len(self.engines)):
+            engine = self.engines[(start + offset) % len(self.engines)]
+            down_until = self._down_until.get(engine)
+            if down_until is None:
+                return engine
+            if down_until <= now and self.probe(engine):
+                return engine
+        return None
+
+
+def read_only_request(app):
+    return request.method in ('GET', 'HEAD') or request.endpoint in app.config.get('READ_ONLY_ENDPOINTS', ())
+
+
+def reads_from_replica(app):
+    """GET views (and READ_ONLY_ENDPOINTS) read from a replica, unless this
+    client wrote something in the last REPLICA_READ_YOUR_WRITES seconds."""
+    if not has_request_context() or not read_only_request(app):
+        return False
+    try:
+        primary_until = float(request.cookies.get('primary_until', 0))
+    except ValueError:
+        primary_until = 0
+    return primary_until < time.time()
+
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None):
+        replicas = self.app.extensions.get('replicas')
+        # flushes are writes and always go to the primary
+        if replicas is None or self._flushing or not reads_from_replica(self.app):
+            return SignallingSession.get_bind(self, mapper, clause)
+        # one replica per request, so a page never mixes two snapshots
+        if 'replica' not in g:
+            g.replica = replicas.choose()
+        return g.replica or SignallingSession.get_bind(self, mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy whose session sends reads to DATABASE_REPLICA_URLS."""
+
+    def init_app(self, app):
+        super(RoutingSQLAlchemy, self).init_app(app)
+        urls = app.config.get('DATABASE_REPLICA_URLS')
+        if urls:
+            app.extensions['replicas'] = ReplicaSet(
+                urls, app.config.get('SQLALCHEMY_ENGINE_OPTIONS'), app.config.get('REPLICA_RETRY_SECONDS', 30))
+        app.after_request(self._remember_write)
+
+    def create_engine(self, sa_url, engine_opts):
+        return super(RoutingSQLAlchemy, self).create_engine(sa_url, engine_options(sa_url, engine_opts))
+
+    def _remember_write(self, response):
+        # read-your-writes: keep this client on the primary for a short while
+        app = self.get_app()
+        if 'replicas' not in app.extensions or read_only_request(app):
+            return response
+        window = app.config.get('REPLICA_READ_YOUR_WRITES', 5)
+        if window:
+            response.set_cookie('primary_until', '%.3f' % (time.time() + window), max_age=int(window) + 1,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
@@ -0,0 +1,98 @@
+"""Fixtures for the tests that run against PostgreSQL.
+
+TEST_DATABASE_URL names a database the tests may empty and refill. Without
+it a throwaway cluster is created the way benchmarks/routes.py does (initdb
+and pg_ctl on PATH or in PG_BIN), and the tests that need a database are
+skipped when neither is available.
+"""
+import os
+import sys
+import shutil
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# after the root, benchmarks/autocomplete.py and projections.py would
+# otherwise shadow the app's modules of the same name
+sys.path.append(os.path.join(ROOT, 'benchmarks'))
+
+# no background roll-over ticks or index rebuilds while queries are counted
+os.environ.setdefault('SHOW_ROLLOVER_INTERVAL', '0')
+os.environ.setdefault('AUTOCOMPLETE_REBUILD_INTERVAL', '0')
+
+
+@pytest.fixture(scope='session')
+def database_url():
+    url = os.environ.get('TEST_DATABASE_URL')
+    if url:
+        yield url
+        return
+    path = os.environ.get('PG_BIN', '') + os.pathsep + os.environ.get('PATH', '')
+    if shutil.which('initdb', path=path) is None or shutil.which('pg_ctl', path=path) is None:
+        pytest.skip('needs PostgreSQL: set TEST_DATABASE_URL or put initdb and pg_ctl on PATH')
+    from routes import local_postgres
+    with local_postgres() as url:
+        yield url
+
+
+@pytest.fixture(scope='session')
+def fyyur(database_url):
+    """The app module, on a migrated test database."""
+    # config.py reads DATABASE_URL when app.py is first imported, tests
+    # without a database may have imported it already
+    os.environ['DATABASE_URL'] = database_url
+    import app as fyyur
+    from flask_migrate import upgrade
+    fyyur.app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    with fyyur.app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+    return fyyur
+
+
+@pytest.fixture(scope='session')
+def reseed(fyyur):
+    """reseed(shows) empties the tables and fills them with benchmarks/seed.py."""
+    import seed
+
+    def reseed(shows):
+        with fyyur.app.app_context():
+            fyyur.db.session.execute(fyyur.db.text(
+                'TRUNCATE "Availability", "Show", "Venue", "Artist" RESTART IDENTITY'))
+            fyyur.db.session.commit()
+            counts = seed.seed(shows)
+            fyyur.db.session.remove()
+        fyyur.page_cache.clear()
+        return counts
+
+    return reseed
+
+
+@pytest.fixture
+def client(fyyur):
+    client = fyyur.app.test_client()
+    # the first request builds the autocomplete index, keep it out of the counts
+    client.get('/')
+    return client
+
+
+@pytest.fixture
+def statements(fyyur):
+    """statements(call) runs call() and returns its result and the
+    (statement, parameters) it sent to the database."""
+    def statements(call):
+        sent = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            sent.append((statement, parameters))
+
+        with fyyur.app.app_context():
+            engine = fyyur.db.engine
+        fyyur.db.event.listen(engine, 'before_cursor_execute', record)
+        try:
+            result = call()
+        finally:
+            fyyur.db.event.remove(engine, 'before_cursor_execute', record)
+        return result, sent
+
+    return statements
@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+
+import pytest
+from flask import Flask
+from werkzeug.http import http_date
+
+from conditional import conditional
+
+MODIFIED = datetime(2026, 10, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def listing():
+    """A listing validated like table_validator: the newest row's time and a
+    count. rows.pop() removes a row without moving the newest time."""
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    rows = [MODIFIED, MODIFIED]
+
+    def validator():
+        return MODIFIED, [MODIFIED, len(rows)]
+
+    for path, modified_since in (('/modified-since', True), ('/etag-only', False)):
+        app.add_url_rule(path, path, conditional(validator, modified_since=modified_since)(
+            lambda: '%d rows' % len(rows)))
+    return app.test_client(), rows
+
+
+def test_if_modified_since_answers_304_unless_disabled(listing):
+    client, rows = listing
+    headers = {'If-Modified-Since': http_date(MODIFIED)}
+    assert client.get('/modified-since', headers=headers).status_code == 304
+    assert client.get('/etag-only', headers=headers).status_code == 200
+
+
+def test_a_delete_changes_the_etag_but_not_last_modified(listing):
+    client, rows = listing
+    first = client.get('/etag-only')
+    etag = first.headers['ETag']
+    assert client.get('/etag-only', headers={'If-None-Match': etag}).status_code == 304
+
+    rows.pop()
+    response = client.get('/etag-only', headers={'If-None-Match': etag,
+                                                 'If-Modified-Since': http_date(MODIFIED)})
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == '1 rows'
+    assert response.headers['Last-Modified'] == first.headers['Last-Modified']
@@ -0,0 +1,28 @@
+import time
+import threading
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from database import pool_stats
+from routing import engine_options
+
+
+def test_pool_stats_count_callers_waiting_for_a_connection(tmp_path):
+    url = 'sqlite:///%s' % (tmp_path / 'pool.db')
+    engine = create_engine(url, **engine_options(url, {'poolclass': QueuePool, 'pool_size': 1, 'max_overflow': 0,
+                                                       'pool_timeout': 5}))
+    held = engine.connect()
+    assert pool_stats(engine)['waiting'] == 0
+
+    waiter = threading.Thread(target=lambda: engine.connect().close())
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while pool_stats(engine)['waiting'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stats = pool_stats(engine)
+    assert stats['waiting'] == 1 and stats['checkedout'] == 1
+
+    held.close()
+    waiter.join(5)
+    assert pool_stats(engine)['waiting'] == 0
@@ -0,0 +1,57 @@
+import jinja2
+import pytest
+from flask import Flask, Response, render_template, stream_with_context
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+
+from instrumentation import SQLInstrumentation
+
+
+@pytest.fixture
+def instrumented():
+    """An app rendering the same template, which runs one query per row,
+    whole and streamed."""
+    app = Flask(__name__)
+    app.jinja_loader = jinja2.DictLoader({
+        'rows.html': '{% for row in rows %}{{ query(row) }} {% endfor %}',
+    })
+    instrumentation = SQLInstrumentation(app)
+    engine = create_engine('sqlite://')
+
+    def query(row):
+        with engine.connect() as conn:
+            return conn.execute(text('SELECT :row'), {'row': row}).scalar()
+
+    @app.route('/rendered')
+    def rendered():
+        return render_template('rows.html', rows=range(3), query=query)
+
+    @app.route('/streamed')
+    def streamed():
+        template = app.jinja_env.get_template('rows.html')
+        return Response(stream_with_context(template.generate(rows=range(3), query=query)))
+
+    yield app.test_client(), instrumentation
+    # the listeners are on every Engine, leave none behind for the next app
+    event.remove(Engine, 'before_cursor_execute', instrumentation._before_cursor_execute)
+    event.remove(Engine, 'after_cursor_execute', instrumentation._after_cursor_execute)
+
+
+def test_streamed_queries_are_recorded_once_the_response_closes(instrumented):
+    client, instrumentation = instrumented
+    for path in ('/rendered', '/streamed'):
+        response = client.get(path)
+        assert response.get_data(as_text=True) == '0 1 2 '
+        response.close()
+
+    rows = {row['endpoint']: row for row in instrumentation.summary()}
+    assert rows['rendered']['max_queries'] == rows['streamed']['max_queries'] == 3
+    assert rows['streamed']['avg_render_ms'] > 0
+
+
+def test_server_timing_of_a_streamed_response_leaves_out_the_body(instrumented):
+    client, instrumentation = instrumented
+    assert 'desc="3 queries"' in client.get('/rendered').headers['Server-Timing']
+    response = client.get('/streamed')
+    assert 'desc="0 queries"' in response.headers['Server-Timing']
+    response.close()
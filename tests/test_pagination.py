@@ -0,0 +1,45 @@
+import pytest
+
+SHOWS = 2000  # 200 artists, see benchmarks/seed.py
+
+
+@pytest.mark.parametrize('limit, expected', [
+    (None, 50), ('', 50), ('abc', 50), ('0', 50), ('-1', 50), ('10', 10), ('10000000', 500),
+])
+def test_page_size_is_bounded(limit, expected):
+    from app import app, page_size
+    query = {} if limit is None else {'limit': limit}
+    with app.test_request_context('/artists', query_string=query):
+        assert app.config['PAGE_SIZE'] == 50 and app.config['MAX_PAGE_SIZE'] == 500
+        assert page_size() == expected
+
+
+@pytest.fixture(scope='module')
+def artists(fyyur, reseed):
+    return reseed(SHOWS)['artists']
+
+
+@pytest.mark.parametrize('limit', ['0', '-1'])
+def test_listings_stay_paged_without_a_positive_limit(fyyur, artists, limit):
+    page_size = fyyur.app.config['PAGE_SIZE']
+    assert artists > page_size
+    client = fyyur.app.test_client()
+
+    response = client.get('/artists', query_string={'limit': limit})
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).count('<a href="/artists/') == page_size
+
+    response = client.get('/api/v1/artists', query_string={'limit': limit})
+    assert response.status_code == 200
+    assert len(response.get_json()['data']) == page_size
+
+
+@pytest.mark.parametrize('limit, expected', [
+    (None, 50), ('0', 50), ('-1', 50), ('abc', 50), ('10', 10), ('1000', 50),
+])
+def test_show_history_limit_is_bounded(limit, expected):
+    from app import app, show_history_limit
+    query = {} if limit is None else {'limit': limit}
+    with app.test_request_context('/venues/1', query_string=query):
+        assert app.config['SHOW_HISTORY_LIMIT'] == 50
+        assert show_history_limit() == expected
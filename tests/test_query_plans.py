@@ -0,0 +1,40 @@
+import os
+import argparse
+from datetime import datetime
+
+import pytest
+
+# big enough for the planner to prefer the indexes where they matter
+SHOWS = os.environ.get('TEST_PLAN_SHOWS', '100k')
+
+
+@pytest.fixture(scope='module')
+def seeded(fyyur, reseed):
+    import seed
+    from availability import seed_calendars
+
+    reseed(seed.parse_scale(SHOWS))
+    db = fyyur.db
+    with fyyur.app.app_context():
+        owners = [('venue_id', row.id) for row in db.session.query(fyyur.Venue.id)]
+        owners += [('artist_id', row.id) for row in db.session.query(fyyur.Artist.id)]
+        calendars = argparse.Namespace(seed=7, windows=5, weekly=1)
+        seed_calendars(db, fyyur.Availability, owners, calendars, datetime.now().replace(second=0, microsecond=0))
+        venue_id, artist_id = owners[0][1], owners[-1][1]
+        db.session.remove()
+        # as autovacuum would have by now, index-only scans need the visibility map
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.exec_driver_sql('VACUUM ANALYZE')
+    return venue_id, artist_id
+
+
+def test_main_queries_use_indexes(fyyur, seeded):
+    failures = []
+    with fyyur.app.app_context():
+        for route, call in fyyur.main_queries(*seeded):
+            statements = fyyur.main_query_statements(call)
+            assert statements, route
+            for statement, tables in fyyur.seq_scans(statements):
+                failures.append('%s: seq scan on %s: %s' % (route, ', '.join(tables), ' '.join(statement.split())))
+
+    assert not failures, '\n'.join(failures)
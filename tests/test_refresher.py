@@ -0,0 +1,25 @@
+import time
+import threading
+
+from refresher import DebouncedRefresher
+
+
+def test_a_failed_refresh_is_retried_with_backoff():
+    attempts = []
+    done = threading.Event()
+
+    def refresh():
+        attempts.append(time.time())
+        if len(attempts) < 3:
+            raise RuntimeError('database went away')
+        done.set()
+
+    refresher = DebouncedRefresher(refresh, delay=0.05, max_delay=1.0)
+    refresher.request()
+    assert done.wait(5)
+
+    metrics = refresher.metrics()
+    assert metrics['failures'] == 2 and metrics['refreshes'] == 1
+    assert metrics['stale_seconds'] == 0
+    # the second retry waits twice as long as the first
+    assert attempts[1] - attempts[0] >= 0.05 and attempts[2] - attempts[1] >= 0.1
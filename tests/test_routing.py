@@ -0,0 +1,76 @@
+import time
+
+import pytest
+from flask import Flask, request
+
+import config
+from routing import RoutingSQLAlchemy
+
+
+@pytest.fixture
+def routed(tmp_path):
+    """A small app on two SQLite files, a primary and a replica, with the
+    engine options of config.py. Each database holds one note naming it."""
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI='sqlite:///%s' % (tmp_path / 'primary.db'),
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        SQLALCHEMY_ENGINE_OPTIONS=config.SQLALCHEMY_ENGINE_OPTIONS,
+        DATABASE_REPLICA_URLS=['sqlite:///%s' % (tmp_path / 'replica.db')],
+        REPLICA_READ_YOUR_WRITES=5,
+    )
+    db = RoutingSQLAlchemy(app)
+
+    class Note(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        text = db.Column(db.String, nullable=False)
+
+    @app.route('/notes')
+    def notes():
+        return ','.join(note.text for note in Note.query.order_by(Note.id))
+
+    @app.route('/notes', methods=['POST'])
+    def add_note():
+        db.session.add(Note(text=request.form['text']))
+        db.session.commit()
+        return '', 201
+
+    replica = app.extensions['replicas'].engines[0]
+    with app.app_context():
+        for engine, text in ((db.engine, 'primary'), (replica, 'replica')):
+            db.Model.metadata.create_all(engine)
+            with engine.begin() as conn:
+                conn.execute(Note.__table__.insert(), {'text': text})
+    return app, db, Note, replica
+
+
+def texts(engine, Note):
+    with engine.connect() as conn:
+        return [row.text for row in conn.execute(Note.__table__.select().order_by(Note.id))]
+
+
+def test_reads_go_to_the_replica(routed):
+    app, db, Note, replica = routed
+    assert app.test_client().get('/notes').get_data(as_text=True) == 'replica'
+
+
+def test_writes_go_to_the_primary(routed):
+    app, db, Note, replica = routed
+    response = app.test_client().post('/notes', data={'text': 'new'})
+    assert response.status_code == 201
+    with app.app_context():
+        assert texts(db.engine, Note) == ['primary', 'new']
+    assert texts(replica, Note) == ['replica']
+
+
+def test_reads_stay_on_the_primary_after_a_write(routed):
+    app, db, Note, replica = routed
+    client = app.test_client()
+    response = client.post('/notes', data={'text': 'new'})
+    primary_until = float(response.headers['Set-Cookie'].split(';')[0].split('=')[1])
+    assert time.time() < primary_until <= time.time() + 5
+    assert client.get('/notes').get_data(as_text=True) == 'primary,new'
+
+    # once the window has passed the client reads from the replica again
+    client.set_cookie('localhost', 'primary_until', '%.3f' % (time.time() - 1))
+    assert client.get('/notes').get_data(as_text=True) == 'replica'
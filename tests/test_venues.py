@@ -0,0 +1,14 @@
+SHOWS = 200  # one venue per 20 shows, see benchmarks/seed.py
+
+
+def test_venues_query_count_does_not_grow_with_the_data(fyyur, reseed, client, statements):
+    counts = []
+    for shows in (SHOWS, 10 * SHOWS):
+        venues = reseed(shows)['venues']
+        response, sent = statements(lambda: client.get('/venues'))
+        assert response.status_code == 200
+        listed = response.get_data(as_text=True).count('<a href="/venues/')
+        assert listed == min(venues, fyyur.app.config['PAGE_SIZE'])
+        counts.append(len(sent))
+
+    assert counts[0] == counts[1], counts